@@ -0,0 +1,72 @@
+"""Linear genre/year scan against CatalogIndex lookups, run with `python -m benchmarks.filter_benchmark`."""
+import random
+import timeit
+
+from lib import log
+from lib.catalog_index import CatalogIndex
+from lib.model.catalog_type import CatalogType
+from lib.providers.catalog_info import ImdbInfo
+
+PAGE_SIZE = 25
+GENRES = ["Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama", "Family",
+          "Fantasy", "History", "Horror", "Music", "Mystery", "Romance", "Sci-Fi", "Thriller"]
+
+
+def load_largest_catalog() -> tuple[str, list[ImdbInfo]]:
+    try:
+        from lib.database_manager import DatabaseManager
+
+        catalogs = DatabaseManager.instance().cached_catalogs
+        if len(catalogs) > 0:
+            key = max(catalogs, key=lambda k: len(catalogs[k].get("data") or []))
+            return key, catalogs[key].get("data") or []
+    except Exception as e:
+        log.warning(f"Database unavailable, using a synthetic catalog: {e}")
+    items = [
+        ImdbInfo(
+            id=f"tt{i:07d}",
+            type=CatalogType.MOVIES,
+            genres=random.sample(GENRES, 3),
+            year=str(random.randint(1980, 2024)),
+        )
+        for i in range(8000)
+    ]
+    return "synthetic", items
+
+
+def scan_page(items: list[ImdbInfo], genre: str, skip: int) -> list[ImdbInfo]:
+    new_items = []
+    if genre.isnumeric():
+        new_items = [item for item in items if genre == item.year]
+    else:
+        new_items = [item for item in items if genre in item.genres]
+    return new_items[skip:skip + PAGE_SIZE]
+
+
+def index_page(index: CatalogIndex, genre: str, skip: int) -> list[ImdbInfo]:
+    if genre.isnumeric():
+        return index.get_items(year=genre, skip=skip, limit=PAGE_SIZE)
+    return index.get_items(genre=genre, skip=skip, limit=PAGE_SIZE)
+
+
+def main():
+    name, items = load_largest_catalog()
+    index = CatalogIndex(items)
+    filters = index.genres + index.years
+    number = 20
+    build_time = timeit.timeit(lambda: CatalogIndex(items), number=number) / number
+
+    print(f"catalog: {name} ({len(items)} items, {len(filters)} filter values)")
+    print(f"index build: {build_time * 1000:.3f} ms")
+    for skip in (0, 100):
+        for value in filters:
+            assert [i.id for i in scan_page(items, value, skip)] == [i.id for i in index_page(index, value, skip)]
+        scan = timeit.timeit(lambda: [scan_page(items, v, skip) for v in filters], number=number)
+        indexed = timeit.timeit(lambda: [index_page(index, v, skip) for v in filters], number=number)
+        per_scan = scan / (number * len(filters)) * 1e6
+        per_index = indexed / (number * len(filters)) * 1e6
+        print(f"skip={skip}: scan {per_scan:.1f} us/page, index {per_index:.1f} us/page ({per_scan / per_index:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
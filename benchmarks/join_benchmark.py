@@ -0,0 +1,109 @@
+"""Nested-loop meta assembly against the id-keyed joins, run with `python -m benchmarks.join_benchmark`."""
+import random
+import time
+
+from lib.apis.cinemeta import Cinemeta
+from lib.model.catalog_type import CatalogType
+from lib.providers.catalog_info import ImdbInfo
+from lib.utils import index_by_id
+
+# Synthetic catalogs sized like a real build
+CATALOG_CONFIGS = 67
+INFOS_PER_CATALOG = 3000
+PAGE_SIZE = 25
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Romance", "Sci-Fi", "Thriller", "Documentary"]
+
+
+def make_catalog(size: int) -> tuple[list[ImdbInfo], list[dict]]:
+    ids = [f"tt{random.randint(1, 10_000_000):07d}" for _ in range(size)]
+    infos = [ImdbInfo(id=imdb_id, type=CatalogType.MOVIES) for imdb_id in ids]
+    metas = [
+        {"id": imdb_id, "genres": random.sample(GENRES, 2), "releaseInfo": str(random.randint(1980, 2024))}
+        for imdb_id in ids
+    ]
+    random.shuffle(metas)
+    return infos, metas
+
+
+def nested_update_imdb_infos(infos: list[ImdbInfo], metas: list[dict]) -> list[ImdbInfo]:
+    new_infos = []
+    for info in infos:
+        for value in metas:
+            if value.get("id", None) == info.id:
+                genres = value.get("genres") or []
+                if len(genres) == 0:
+                    continue
+                info.set_genres([Cinemeta.get_simplified_genre(genre) for genre in genres])
+                info.set_year(value.get("releaseInfo") or "")
+                new_infos.append(info)
+                break
+    return new_infos
+
+
+def joined_update_imdb_infos(infos: list[ImdbInfo], metas: list[dict]) -> list[ImdbInfo]:
+    metas_by_id = index_by_id(metas)
+    new_infos = []
+    for info in infos:
+        value = metas_by_id.get(info.id, None)
+        if value is None:
+            continue
+        genres = value.get("genres") or []
+        if len(genres) == 0:
+            continue
+        info.set_genres([Cinemeta.get_simplified_genre(genre) for genre in genres])
+        info.set_year(value.get("releaseInfo") or "")
+        new_infos.append(info)
+    return new_infos
+
+
+def nested_page_metas(page: list[ImdbInfo], metas: list[dict]) -> list[dict]:
+    sorted_metas = []
+    for item in page:
+        for meta in metas:
+            if meta.get("id") == item.id:
+                sorted_metas.append(meta)
+                break
+    return sorted_metas
+
+
+def joined_page_metas(page: list[ImdbInfo], metas: list[dict]) -> list[dict]:
+    metas_by_id = index_by_id(metas)
+    return [metas_by_id[item.id] for item in page if item.id in metas_by_id]
+
+
+def timed(function, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    random.seed(42)
+    catalogs = [make_catalog(INFOS_PER_CATALOG) for _ in range(CATALOG_CONFIGS)]
+
+    sample = catalogs[:3]
+    nested = sum(timed(nested_update_imdb_infos, infos, metas)[0] for infos, metas in sample) / len(sample)
+    joined_total = 0.0
+    for infos, metas in catalogs:
+        elapsed, result = timed(joined_update_imdb_infos, infos, metas)
+        joined_total += elapsed
+    assert [i.id for i in nested_update_imdb_infos(*sample[0])] == [i.id for i in joined_update_imdb_infos(*sample[0])]
+    joined = joined_total / len(catalogs)
+    print(f"build path ({CATALOG_CONFIGS} configs x {INFOS_PER_CATALOG} infos):")
+    print(f"  nested {nested * 1000:.1f} ms/catalog (~{nested * CATALOG_CONFIGS:.1f} s per build)")
+    print(f"  joined {joined * 1000:.2f} ms/catalog (~{joined_total:.2f} s per build, {nested / joined:.0f}x)")
+
+    rounds = 2000
+    infos, metas = catalogs[0]
+    pages = [infos[skip:skip + PAGE_SIZE] for skip in range(0, len(infos), PAGE_SIZE)]
+    page_metas = [nested_page_metas(page, metas) for page in pages]
+    page_metas = [list(reversed(m)) for m in page_metas]
+    nested = timed(lambda: [nested_page_metas(p, m) for _ in range(rounds // len(pages) + 1) for p, m in zip(pages, page_metas)])[0]
+    joined = timed(lambda: [joined_page_metas(p, m) for _ in range(rounds // len(pages) + 1) for p, m in zip(pages, page_metas)])[0]
+    count = (rounds // len(pages) + 1) * len(pages)
+    print(f"serve path ({PAGE_SIZE} metas/page, {count} pages):")
+    print(f"  nested {nested / count * 1e6:.1f} us/page, joined {joined / count * 1e6:.1f} us/page ({nested / joined:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Memory and load time of dict-based and compact ImdbInfo, run with `python -m benchmarks.memory_benchmark`."""
+import gc
+import random
+import time
+import tracemalloc
+
+from lib import log
+from lib.model.catalog_type import CatalogType
+from lib.providers.catalog_info import ImdbInfo
+
+GENRES = ["Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama", "Family",
+          "Fantasy", "History", "Horror", "Music", "Mystery", "Romance", "Sci-Fi", "Thriller"]
+
+
+class LegacyImdbInfo:
+    """ImdbInfo as it was before the compact representation."""
+
+    def __init__(self, id: str, type: CatalogType, genres=[], year="") -> None:
+        self.id = id
+        self.type = type
+        self.genres = genres
+        self.year = year
+
+    @staticmethod
+    def from_dict(data: dict):
+        return LegacyImdbInfo(
+            id=data.get("id"),
+            type=CatalogType(data.get("type")),
+            genres=data.get("genres"),
+            year=data.get("year") or "",
+        )
+
+
+def load_catalog_rows() -> tuple[str, dict[str, list[dict]]]:
+    try:
+        from lib.database_manager import DatabaseManager
+
+        catalogs = DatabaseManager.instance().cached_catalogs
+        if len(catalogs) > 0:
+            return "database", {
+                key: [item.to_dict() for item in value.get("data") or []] for key, value in catalogs.items()
+            }
+    except Exception as e:
+        log.warning(f"Database unavailable, using synthetic catalogs: {e}")
+    rows = {}
+    for idx in range(120):
+        rows[f"synthetic.{idx}"] = [
+            {
+                "id": f"tt{random.randint(1, 3000000):07d}",
+                "type": random.choice(["movie", "series"]),
+                "genres": random.sample(GENRES, random.randint(1, 3)),
+                "year": str(random.randint(1960, 2024)),
+            }
+            for _ in range(500)
+        ]
+    return "synthetic", rows
+
+
+def decode_rows(rows: dict[str, list[dict]]) -> dict[str, list[dict]]:
+    # Fresh strings and lists for every run, as they would be when read from Supabase
+    return {
+        key: [{k: (list(v) if k == "genres" else "".join(v)) for k, v in row.items()} for row in items]
+        for key, items in rows.items()
+    }
+
+
+def measure_time(factory, rows: dict[str, list[dict]], number: int = 5) -> float:
+    best = None
+    for _ in range(number):
+        decoded = decode_rows(rows)
+        start = time.perf_counter()
+        catalogs = {key: [factory(row) for row in items] for key, items in decoded.items()}
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        del catalogs, decoded
+    return best
+
+
+def measure_memory(factory, rows: dict[str, list[dict]]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    decoded = decode_rows(rows)
+    catalogs = {key: [factory(row) for row in items] for key, items in decoded.items()}
+    # Drop the source rows so only what the catalogs keep alive is counted
+    del decoded
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del catalogs
+    return size
+
+
+def main():
+    name, rows = load_catalog_rows()
+    count = sum(len(items) for items in rows.values())
+    print(f"catalogs: {name} ({len(rows)} catalogs, {count} items)")
+    results = {}
+    for label, factory in (("legacy", LegacyImdbInfo.from_dict), ("compact", ImdbInfo.from_dict)):
+        elapsed = measure_time(factory, rows)
+        size = measure_memory(factory, rows)
+        results[label] = (elapsed, size)
+        print(f"{label}: load {elapsed * 1000:.1f} ms, retained {size / 1024 / 1024:.2f} MiB ({size / count:.0f} B/item)")
+    legacy, compact = results["legacy"], results["compact"]
+    print(f"memory {legacy[1] / compact[1]:.1f}x smaller, load {legacy[0] / compact[0]:.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
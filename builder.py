@@ -1,10 +1,16 @@
 # from datetime import datetime
-from lib.env import SKIP_DB_UPDATE
-from rich.progress import track
-from datetime import datetime
+import asyncio
+import time
+from typing import Awaitable, Callable
+from lib.env import REFRESH_SCHEDULE_PATH, SKIP_DB_UPDATE
+from collections import OrderedDict
 from catalog_list import CatalogList
 from lib import log
 from lib.apis.cinemeta import Cinemeta
+from lib.catalog_index import CatalogIndex
+from lib.cinemeta_loader import CinemetaLoader
+from lib.http_session import HttpSession
+from lib.metrics import BUILD_SECONDS, CATALOG_BUILD_SECONDS
 from lib.model.catalog_config import CatalogConfig
 from lib.model.catalog_filter_type import CatalogFilterType
 from lib.model.catalog_type import CatalogType
@@ -17,11 +23,20 @@ from lib.providers.just_watch_provider import JustWatchProvider
 from lib.providers.mdblist_provider import MDBListProvider
 from lib.providers.tmdb_provider import TMDBProvider
 from lib.providers.trakt_provider import TraktProvider
-from lib.utils import parallel_for
+from lib.refresh_schedule import RefreshSchedule
+from lib.utils import index_by_id
 from lib.database_manager import DatabaseManager
 
 db_manager = DatabaseManager.instance()
 
+# Catalogs listed at once overall and per provider
+BUILD_CONCURRENCY = 8
+PROVIDER_CONCURRENCY = 3
+# Catalogs fetching their metas at once, requests to each host are capped by the shared HTTP session
+META_CONCURRENCY = 8
+# Catalogs waiting between two stages before the earlier one is held back
+QUEUE_SIZE = 16
+
 class Builder:
     def __init__(self) -> None:
         log.info(f"::=> Initializing {self.__class__.__name__}...")
@@ -35,36 +50,30 @@ class Builder:
         }
         self.__manifest: Manifest = Manifest()
 
-    def update_imdb_infos(self, infos: list[ImdbInfo], values: dict = {}) -> list[ImdbInfo]:
-        metas = values.get("metas") or []
+    def update_imdb_infos(self, infos: list[ImdbInfo], metas_by_id: dict[str, dict]) -> list[ImdbInfo]:
         new_infos = []
         for info in infos:
-            for value in metas:
-                meta_id = value.get("id", None)
-                if meta_id == info.id:
-                    genres = value.get("genres") or []
-                    if len(genres) == 0:
-                        continue
-                    new_genres = []
-                    for genre in genres:
-                        new_genres.append(Cinemeta.get_simplified_genre(genre))
-                    info.set_genres(new_genres)
-                    year = value.get("releaseInfo") or ""
-                    info.set_year(year)
-                    new_infos.append(info)
-                    break
+            value = metas_by_id.get(info.id, None)
+            if value is None:
+                continue
+            genres = value.get("genres") or []
+            if len(genres) == 0:
+                continue
+            new_genres = []
+            for genre in genres:
+                new_genres.append(Cinemeta.get_simplified_genre(genre))
+            info.set_genres(new_genres)
+            year = value.get("releaseInfo") or ""
+            info.set_year(year)
+            new_infos.append(info)
         return new_infos
 
     def build_manifiest_item(self, item: CatalogConfig, conf_type: CatalogType, values: list[ImdbInfo]) -> dict:
-        unique_filters = set()
-        for value in values:
-            if item.filter_type == CatalogFilterType.CATEGORIES:
-                for genre in value.genres:
-                    unique_filters.add(genre)
-            elif item.filter_type == CatalogFilterType.YEARS:
-                year = value.year
-                if year is not None:
-                    unique_filters.add(year)
+        unique_filters = []
+        if item.filter_type == CatalogFilterType.CATEGORIES:
+            unique_filters = CatalogIndex(values).genres
+        elif item.filter_type == CatalogFilterType.YEARS:
+            unique_filters = CatalogIndex(values).years
         is_type_years = item.filter_type == CatalogFilterType.YEARS
         unique_filters = sorted(list(unique_filters), reverse=is_type_years)
         if is_type_years and len(unique_filters) > 15:
@@ -103,71 +112,136 @@ class Builder:
     def __get_item_id(self, item: CatalogConfig, conf_type: CatalogType) -> str:
         return f"{item.name_id.lower()}.{conf_type.value.lower()}"
 
-    def build_catalog(self, item: CatalogConfig) -> list:
-        outputs = []
-        types = item.types.copy()
-        provider = self.__catalog_providers.get(item.provider_id, None)
-        if provider is None:
-            return outputs
-
-        current_time = datetime.now()
-        for conf_type in types[:]:
-            item_id = self.__get_item_id(item, conf_type)
-            existing_catalog = db_manager.cached_catalogs.get(item_id)
-            if existing_catalog is None:
-                continue
-            # expiration_date = datetime.fromisoformat(existing_catalog.get('expiration_date'))
-            # if not item.force_update and existing_catalog and expiration_date:
-            #     if current_time < expiration_date:
-            #         data = existing_catalog.get('data')
-            #         outputs.append(self.build_manifiest_item(item, conf_type, data))
-            #         types.remove(conf_type)
-            #         continue
-
-        if not types:
-            return outputs
+    def __is_due(
+        self, config: CatalogConfig, conf_type: CatalogType, catalogs: dict, schedule: RefreshSchedule | None
+    ) -> bool:
+        provider = self.__catalog_providers.get(config.provider_id)
+        if provider is None or provider.on_demand:
+            return False
+        item_id = self.__get_item_id(config, conf_type)
+        return schedule is None or config.force_update or item_id not in catalogs or schedule.is_due(item_id)
 
+    async def build_catalogs(
+        self, configs: list[CatalogConfig], catalogs: dict, metas: dict, schedule: RefreshSchedule | None = None
+    ) -> list:
+        """Build the due catalogs into `catalogs` and `metas`, returning the manifest items of all of them."""
+        listing_limit = asyncio.Semaphore(BUILD_CONCURRENCY)
+        provider_limits = {
+            provider_id: asyncio.Semaphore(PROVIDER_CONCURRENCY) for provider_id in self.__catalog_providers
+        }
+        meta_loader = CinemetaLoader()
+        started_at: dict[str, float] = {}
+        manifest_items: dict[tuple[int, int], dict] = {}
 
-        def process_type(conf_type, idx, worker_id):
-            if provider.on_demand:
-                return self.build_manifiest_item(item, conf_type, [])
+        # Listing -> meta fetch -> enrichment, the bounded queues let a slow stage hold back the ones feeding it
+        jobs: asyncio.Queue = asyncio.Queue()
+        listed: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        fetched: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        due_jobs: list[tuple] = []
+        for position, config in enumerate(configs):
+            provider = self.__catalog_providers.get(config.provider_id)
+            if provider is None:
+                continue
+            for type_position, conf_type in enumerate(config.types):
+                job = ((position, type_position), config, conf_type)
+                item_id = self.__get_item_id(config, conf_type)
+                if provider.on_demand:
+                    manifest_items[job[0]] = self.build_manifiest_item(config, conf_type, [])
+                elif self.__is_due(config, conf_type, catalogs, schedule):
+                    due_jobs.append(job)
+                    jobs.put_nowait(job)
+                else:
+                    items = catalogs[item_id].get("data") or []
+                    manifest_items[job[0]] = self.build_manifiest_item(config, conf_type, items)
+        for _ in range(BUILD_CONCURRENCY):
+            jobs.put_nowait(None)
 
-            imdb_infos = provider.get_imdb_info(schema=item.schema, pages=item.pages, c_type=conf_type)
+        async def list_catalog(job: tuple) -> tuple | None:
+            position, config, conf_type = job
+            provider = self.__catalog_providers[config.provider_id]
+            async with listing_limit, provider_limits[config.provider_id]:
+                started_at.setdefault(config.name_id, time.perf_counter())
+                imdb_infos = await asyncio.to_thread(
+                    provider.get_imdb_info, schema=config.schema, pages=config.pages, c_type=conf_type
+                )
             if imdb_infos is None or len(imdb_infos) == 0:
                 return None
+            return position, config, conf_type, imdb_infos
 
-            item_id = self.__get_item_id(item, conf_type)
-            item_metas = provider.get_catalog_metas(imdb_infos)
+        async def fetch_metas(job: tuple) -> tuple | None:
+            position, config, conf_type, imdb_infos = job
+            provider = self.__catalog_providers[config.provider_id]
+            item_metas = await provider.get_catalog_metas_async(imdb_infos, meta_loader=meta_loader)
             if item_metas is None or len(item_metas) == 0:
                 return None
+            complete = not any(meta_loader.has_failed(info.id, info.type.value.lower()) for info in imdb_infos)
+            return position, config, conf_type, imdb_infos, item_metas.get("metas") or [], complete
 
-            metas = item_metas.get("metas") or []
-            dict_by_id = {item.get("id"): item for item in metas}
-            imdb_infos = self.update_imdb_infos(imdb_infos, item_metas)
-
-            return {
-                "item_id": item_id,
-                "dict_by_id": dict_by_id,
-                "imdb_infos": imdb_infos,
-                "manifest_item": self.build_manifiest_item(item, conf_type, imdb_infos)
-            }
+        async def enrich_catalog(job: tuple) -> None:
+            position, config, conf_type, imdb_infos, item_metas, complete = job
+            dict_by_id = index_by_id(item_metas)
+            imdb_infos = self.update_imdb_infos(imdb_infos, dict_by_id)
+            item_id = self.__get_item_id(config, conf_type)
+            metas.update(dict_by_id)
+            catalogs.update({item_id: {"expiration_date": config.expiration_date, "data": imdb_infos}})
+            manifest_items[position] = self.build_manifiest_item(config, conf_type, imdb_infos)
+            if schedule is not None and complete:
+                schedule.mark_built(item_id, config.expiration_days)
+            elif schedule is not None:
+                # Published without the items Cinemeta failed on, built again once the retry delay passed
+                schedule.mark_failed(item_id)
+            CATALOG_BUILD_SECONDS.set(time.perf_counter() - started_at[config.name_id], config.name_id)
+            log.info(f"::=>[Build] {item_id} - {len(imdb_infos)} items")
 
-        results = parallel_for(process_type, types)
-
-        for result in results:
-            if result is None:
+        await asyncio.gather(
+            self.__run_stage(jobs, listed, list_catalog, workers=BUILD_CONCURRENCY, next_workers=META_CONCURRENCY),
+            self.__run_stage(listed, fetched, fetch_metas, workers=META_CONCURRENCY, next_workers=1),
+            self.__run_stage(fetched, None, enrich_catalog, workers=1),
+        )
+        meta_stats = meta_loader.stats
+        log.info(
+            f"::=>[Build] Cinemeta: {meta_stats['fetched_ids']} of {meta_stats['requested_ids']} requested ids "
+            f"fetched in {meta_stats['batches']} batches"
+        )
+        for position, config, conf_type in due_jobs:
+            if position in manifest_items:
                 continue
+            # Failed catalogs keep serving their previous items until they are tried again
+            item_id = self.__get_item_id(config, conf_type)
+            if schedule is not None:
+                schedule.mark_failed(item_id)
+            if item_id in catalogs:
+                items = catalogs[item_id].get("data") or []
+                manifest_items[position] = self.build_manifiest_item(config, conf_type, items)
+        return [manifest_items[position] for position in sorted(manifest_items)]
+
+    @staticmethod
+    async def __run_stage(
+        inbox: asyncio.Queue,
+        outbox: asyncio.Queue | None,
+        handle: Callable[[tuple], Awaitable[tuple | None]],
+        workers: int,
+        next_workers: int = 0,
+    ):
+        """Run `workers` tasks passing jobs from `inbox` through `handle` to `outbox`, until `None` jobs."""
 
-            db_manager.cached_metas.update(result["dict_by_id"])
-            db_manager.cached_catalogs.update({
-                result["item_id"]: {
-                    "expiration_date": item.expiration_date,
-                    "data": result["imdb_infos"]
-                }
-            })
-            outputs.append(result["manifest_item"])
+        async def worker():
+            while True:
+                job = await inbox.get()
+                if job is None:
+                    return
+                try:
+                    result = await handle(job)
+                except Exception as e:
+                    log.error(f"::=>[Build] Stage {handle.__name__} failed: {e}")
+                    continue
+                if result is not None and outbox is not None:
+                    await outbox.put(result)
 
-        return outputs
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        # One `None` per worker of the next stage closes it in turn
+        for _ in range(next_workers):
+            await outbox.put(None)
 
     def get_catalog(self, provider_id: str, schema: str, c_type: CatalogType, **kwargs) -> list:
         provider = self.__catalog_providers.get(provider_id, None)
@@ -178,31 +252,63 @@ class Builder:
             return []
         return imdb_infos
 
-    def build(self):
+    def build(self) -> bool:
+        """Rebuild the due catalogs on the side and publish them, False when none of them could be built."""
         log.info("Caching catalongs...")
+        build_start = time.perf_counter()
         configs = CatalogList.get_catalog_configs()
 
-        manifest_catalog = []
-        current_catalog = ""
-        for config in track(configs, f"Building: {current_catalog}"):
-            current_catalog = config.name_id
-            data = self.build_catalog(config)
-            manifest_catalog.extend(data)
+        # The served snapshot is never touched, readers keep it until the publish below
+        previous_catalogs = db_manager.cached_catalogs
+        catalogs = OrderedDict(previous_catalogs)
+        metas = {}
+        schedule = RefreshSchedule(REFRESH_SCHEDULE_PATH)
+        schedule.seed(catalogs)
+        due = [
+            self.__get_item_id(config, conf_type)
+            for config in configs
+            for conf_type in config.types
+            if self.__is_due(config, conf_type, catalogs, schedule)
+        ]
+        if len(due) == 0:
+            log.info("::=>[Build] No catalogs are due")
+            return True
+        log.info(f"::=>[Build] {len(due)} catalogs are due")
+
+        async def build_catalogs() -> list:
+            try:
+                return await self.build_catalogs(configs, catalogs, metas, schedule)
+            finally:
+                await HttpSession.close_async_client()
+
+        manifest_catalog = asyncio.run(build_catalogs())
+
+        rebuilt = [key for key, value in catalogs.items() if value is not previous_catalogs.get(key)]
+        if len(manifest_catalog) == 0 or len(rebuilt) == 0:
+            log.error("No catalogs were built, keeping the current snapshot")
+            BUILD_SECONDS.observe(time.perf_counter() - build_start, "empty")
+            return False
+        manifest = self.__manifest.get_meta(catalogs_config=manifest_catalog)
 
         if not SKIP_DB_UPDATE:
             log.info("Uploading tmdb ids ...")
             db_manager.update_tmdb_ids(db_manager.cached_tmdb_ids)
 
             log.info("Uploading metas ...")
-            db_manager.update_metas(metas=db_manager.cached_metas)
+            db_manager.update_metas(metas=metas)
 
             log.info("Uploading catalogs ...")
-            db_manager.update_catalogs(catalogs=db_manager.cached_catalogs)
+            db_manager.update_catalogs(catalogs=catalogs)
 
             log.info("Uploading manifest ...")
-            manifest = self.__manifest.get_meta(catalogs_config=manifest_catalog)
             db_manager.update_manifest(manifest=manifest)
 
+        db_manager.publish_snapshot(manifest=manifest, catalogs=catalogs, metas=metas)
+        schedule.save()
+        log.info(f"::=>[Build] Rebuilt {len(rebuilt)} of {len(due)} due catalogs")
+        BUILD_SECONDS.observe(time.perf_counter() - build_start, "published")
+        return True
+
 
 if __name__ == "__main__":
     Builder().build()
@@ -1,7 +1,7 @@
-import time
-
 import httpx
 
+from lib.http_session import HttpSession
+
 
 class AniList:
     def __init__(self) -> None:
@@ -63,45 +63,43 @@ class AniList:
 
         items = []
         query = self.get_query()
-        with httpx.Client() as client:
-            for page in range(1, pages + 1):
-                time.sleep(timeout)
-
-                variables = {"format": s_type, "sort": sort, "page": page, "perPage": 20}
-                if season:
-                    variables.update({"season": season})
-                if status:
-                    variables.update({"status": status})
-                try:
-                    resp = client.post(
-                        self.__url,
-                        headers=self.__headers,
-                        json={"query": query, "variables": variables},
-                        timeout=timeout,
-                    )
-                    if resp.status_code != 200:
-                        print(f"Failed to fetch {self.__url}, skipping...")
-                        continue
-                    data = dict(resp.json())
-                    page_data = data.get("data", {}).get("Page", {})
-                    media = page_data.get("media", [])
-                    has_next_page = (
-                        data.get("data", False)
-                        .get("Page", False)
-                        .get("pageInfo", False)
-                        .get("hasNextPage", False)
-                        or False
-                    )
-                    for item in media:
-                        data = item.get("title", {})
-                        if data is not None:
-                            items.append(data)
-                    if not has_next_page:
-                        break
-                except httpx.TimeoutException:
-                    print(f"Request timed out, retrying in {timeout} seconds...")
-                    continue
-                except httpx.HTTPError as e:
-                    print(e)
+        client = HttpSession.get_client()
+        for page in range(1, pages + 1):
+            variables = {"format": s_type, "sort": sort, "page": page, "perPage": 20}
+            if season:
+                variables.update({"season": season})
+            if status:
+                variables.update({"status": status})
+            try:
+                resp = client.post(
+                    self.__url,
+                    headers=self.__headers,
+                    json={"query": query, "variables": variables},
+                    timeout=timeout,
+                )
+                if resp.status_code != 200:
+                    print(f"Failed to fetch {self.__url}, skipping...")
                     continue
+                data = dict(resp.json())
+                page_data = data.get("data", {}).get("Page", {})
+                media = page_data.get("media", [])
+                has_next_page = (
+                    data.get("data", False)
+                    .get("Page", False)
+                    .get("pageInfo", False)
+                    .get("hasNextPage", False)
+                    or False
+                )
+                for item in media:
+                    data = item.get("title", {})
+                    if data is not None:
+                        items.append(data)
+                if not has_next_page:
+                    break
+            except httpx.TimeoutException:
+                print(f"Request timed out, retrying in {timeout} seconds...")
+                continue
+            except httpx.HTTPError as e:
+                print(e)
+                continue
         return items
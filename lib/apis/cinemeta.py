@@ -3,9 +3,50 @@ import json
 import httpx
 
 from lib import log
+from lib.http_session import HttpSession
 
 
 class Cinemeta:
+    SIMPLIFIED_GENRES = {
+        "Kids": "Kids",
+        "Musical": "Music",
+        "TV": "Short",
+        "Sci-Fi & Fantasy": "Sci-Fi",
+        "Adult": "Adult",
+        "Family": "Family",
+        "Documentary": "Documentary",
+        "Biography": "Documentary",
+        "War": "Documentary",
+        "Reality-TV": "TV",
+        "Sci-Fi": "Sci-Fi",
+        "Fantasy": "Fantasy",
+        "TV Movie": "TV",
+        "Crime": "Crime",
+        "Romance": "Romance",
+        "History": "History",
+        "Action & Adventure": "Action",
+        "Action": "Action",
+        "Talk-Show": "TV",
+        "War & Politics": "Documentary",
+        "Horror": "Horror",
+        "Sport": "Sport",
+        "Western": "Western",
+        "Comedy": "Comedy",
+        "Music": "Music",
+        "Adventure": "Adventure",
+        "Soap": "TV",
+        "Reality": "TV",
+        "Animation": "Animation",
+        "Game-Show": "TV",
+        "Thriller": "Thriller",
+        "News": "TV",
+        "Talk": "TV",
+        "Science Fiction": "Sci-Fi",
+        "Drama": "Drama",
+        "Film-Noir": "Drama",
+        "Mystery": "Mystery",
+    }
+
     def __init__(self) -> None:
         self.__url = "https://cinemeta-live.strem.io/"
         self.__headers = {
@@ -19,72 +60,74 @@ class Cinemeta:
     def url(self) -> str:
         return self.__url
 
+    def __get_metas_url(self, ids: list[str], s_type: str) -> str:
+        return f"https://v3-cinemeta.strem.io/catalog/{s_type}/last-videos/lastVideosIds={','.join(ids)}.json"
+
+    def __get_meta_url(self, id: str, s_type: str) -> str:
+        return f"{self.__url}meta/{s_type}/{id}.json"
+
+    @staticmethod
+    def __parse_metas(response: httpx.Response) -> list[dict]:
+        if response.status_code != 200:
+            raise httpx.HTTPStatusError(
+                f"Cinemeta returned {response.status_code}", request=response.request, response=response
+            )
+        data = json.loads(response.content or b"{}")
+        if not isinstance(data, dict):
+            return []
+        return [meta for meta in data.get("metasDetailed") or [] if meta is not None]
+
+    @staticmethod
+    def __parse_meta(response: httpx.Response) -> dict | None:
+        if response.status_code != 200 or not response.content:
+            return None
+        return json.loads(response.content)
+
+    def fetch_metas(self, ids: list[str], s_type: str) -> list[dict]:
+        """Metas of a batch of ids, raising `httpx.HTTPError` when the batch could not be fetched."""
+        response = HttpSession.get_client().get(
+            self.__get_metas_url(ids, s_type), headers=self.__headers, timeout=50, follow_redirects=True
+        )
+        return self.__parse_metas(response)
+
+    async def fetch_metas_async(self, ids: list[str], s_type: str) -> list[dict]:
+        response = await HttpSession.get_async_client().get(
+            self.__get_metas_url(ids, s_type), headers=self.__headers, timeout=50, follow_redirects=True
+        )
+        return self.__parse_metas(response)
+
     def get_metas(self, ids: list[str], s_type: str) -> list[dict]:
-        meta_url = f"https://v3-cinemeta.strem.io/catalog/{s_type}/last-videos/lastVideosIds="
-        results = []
-        for idx, id in enumerate(ids):
-            if idx == 0:
-                meta_url += f"{id}"
-            elif idx == len(ids) - 1:
-                meta_url += f",{id}.json"
-            else:
-                meta_url += f",{id}"
-        with httpx.Client(follow_redirects=True) as client:
-            try:
-                response = client.get(meta_url, headers=self.__headers, timeout=50)
-                if response.status_code == 200:
-                    buffer = response.content
-                    if buffer is None:
-                        return results
-                    data = json.loads(buffer)
-                    if isinstance(data, dict):
-                        metas_detailed = data.get("metasDetailed", [])
-                        for meta in metas_detailed:
-                            if meta is not None:
-                                results.append(meta)
-            except Exception as e:
-                log.info(e)
-        return results
+        try:
+            return self.fetch_metas(ids, s_type)
+        except Exception as e:
+            log.info(e)
+        return []
 
     async def get_metas_async(self, ids: list[str], s_type: str) -> list[dict]:
-        meta_url = f"https://v3-cinemeta.strem.io/catalog/{s_type}/last-videos/lastVideosIds="
-        results = []
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            for idx, id in enumerate(ids):
-                if idx == 0:
-                    meta_url += f"{id}"
-                elif idx == len(ids) - 1:
-                    meta_url += f",{id}.json"
-                else:
-                    meta_url += f",{id}"
-            try:
-                response = await client.get(meta_url, headers=self.__headers, timeout=50)
-                if response.status_code == 200:
-                    buffer = response.content
-                    if buffer is None:
-                        return results
-                    data = json.loads(buffer)
-                    if isinstance(data, dict):
-                        metas_detailed = data.get("metasDetailed", [])
-                        for meta in metas_detailed:
-                            if meta is not None:
-                                results.append(meta)
-            except Exception as e:
-                log.info(e)
-        return results
+        try:
+            return await self.fetch_metas_async(ids, s_type)
+        except Exception as e:
+            log.info(e)
+        return []
 
     def get_meta(self, id: str, s_type: str) -> dict | None:
-        meta_url = f"{self.__url}meta/{s_type}/{id}.json"
-        with httpx.Client(follow_redirects=True) as client:
-            try:
-                response = client.get(meta_url, headers=self.__headers, timeout=10)
-                if response.status_code == 200:
-                    buffer = response.content
-                    if buffer is None:
-                        return None
-                    return json.loads(buffer)
-            except Exception as e:
-                log.info(e)
+        try:
+            response = HttpSession.get_client().get(
+                self.__get_meta_url(id, s_type), headers=self.__headers, timeout=10, follow_redirects=True
+            )
+            return self.__parse_meta(response)
+        except Exception as e:
+            log.info(e)
+        return None
+
+    async def get_meta_async(self, id: str, s_type: str) -> dict | None:
+        try:
+            response = await HttpSession.get_async_client().get(
+                self.__get_meta_url(id, s_type), headers=self.__headers, timeout=10, follow_redirects=True
+            )
+            return self.__parse_meta(response)
+        except Exception as e:
+            log.info(e)
         return None
 
     def get_simplified_year(self, year: str) -> str:
@@ -96,43 +139,4 @@ class Cinemeta:
 
     @staticmethod
     def get_simplified_genre(name: str) -> str | None:
-        simplified_genre = {
-            "Kids": "Kids",
-            "Musical": "Music",
-            "TV": "Short",
-            "Sci-Fi & Fantasy": "Sci-Fi",
-            "Adult": "Adult",
-            "Family": "Family",
-            "Documentary": "Documentary",
-            "Biography": "Documentary",
-            "War": "Documentary",
-            "Reality-TV": "TV",
-            "Sci-Fi": "Sci-Fi",
-            "Fantasy": "Fantasy",
-            "TV Movie": "TV",
-            "Crime": "Crime",
-            "Romance": "Romance",
-            "History": "History",
-            "Action & Adventure": "Action",
-            "Action": "Action",
-            "Talk-Show": "TV",
-            "War & Politics": "Documentary",
-            "Horror": "Horror",
-            "Sport": "Sport",
-            "Western": "Western",
-            "Comedy": "Comedy",
-            "Music": "Music",
-            "Adventure": "Adventure",
-            "Soap": "TV",
-            "Reality": "TV",
-            "Animation": "Animation",
-            "Game-Show": "TV",
-            "Thriller": "Thriller",
-            "News": "TV",
-            "Talk": "TV",
-            "Science Fiction": "Sci-Fi",
-            "Drama": "Drama",
-            "Film-Noir": "Drama",
-            "Mystery": "Mystery",
-        }
-        return simplified_genre.get(name, None)
+        return Cinemeta.SIMPLIFIED_GENRES.get(name, None)
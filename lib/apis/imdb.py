@@ -1,5 +1,7 @@
 import httpx
 
+from lib.http_session import HttpSession
+
 
 class IMDB:
     def __init__(self) -> None:
@@ -127,78 +129,79 @@ class IMDB:
             genres = genres.split(",") if "," in genres else [genres]
         last_cursor = ""
         query = {}
-        with httpx.Client() as client:
-            for _ in range(1, pages + 1):
-                if search_term is not None:
-                    query = self.advanced_title_search(
-                        query=search_term,
-                        sort_by=sort_by,
-                        sort_order=sort_order,
-                        locale=locale,
-                        count=count,
-                        types=types,
-                        genres=genres,
-                    )
-                elif event_id is not None:
-                    query = self.get_award_event(
-                        event_id=event_id,
-                        sort_by=sort_by,
-                        sort_order=sort_order,
-                        locale=locale,
-                        count=count,
-                        after_cursor=last_cursor,
-                    )
-                else:
-                    return nodes
-                try:
-                    resp = client.post(
-                        self.__url,
-                        headers=self.__headers,
-                        json=query,
-                        timeout=timeout,
-                    )
-                    if resp.status_code != 200:
-                        print(f"Failed to fetch {self.__url}, skipping...")
-                        continue
-
-                    data = dict(resp.json())
-                    advanced_title_search = data.get("data", {}).get("advancedTitleSearch", {})
-                    if advanced_title_search is None:
-                        continue
-                    has_next_page = advanced_title_search.get("pageInfo", {}).get("hasNextPage", False)
-                    edges = advanced_title_search.get("edges", [])
-                    last_cursor = advanced_title_search.get("pageInfo", {}).get("endCursor", "")
-                    for edge in edges:
-                        info = edge.get("node", {}).get("title", {})
-                        imdb_id = info.get("id", None)
-                        title_text = info.get("titleText", None)
-                        if title_text is None:
-                            continue
-                        imdb_title = title_text.get("text", None)
-                        if imdb_title is None:
-                            continue
-                        title_type = info.get("titleType", None)
-                        if title_type is None:
-                            continue
-                        imdb_type = title_type.get("id", None)
-                        if imdb_type is None:
-                            continue
-                        node = {"id": imdb_id, "title": imdb_title, "type": imdb_type}
-                        nodes.append(node)
-                    if has_next_page is False:
-                        break
-                except httpx.TimeoutException:
-                    print(f"Request timed out, retrying in {timeout} seconds...")
+        client = HttpSession.get_client()
+        for _ in range(1, pages + 1):
+            if search_term is not None:
+                query = self.advanced_title_search(
+                    query=search_term,
+                    sort_by=sort_by,
+                    sort_order=sort_order,
+                    locale=locale,
+                    count=count,
+                    types=types,
+                    genres=genres,
+                )
+            elif event_id is not None:
+                query = self.get_award_event(
+                    event_id=event_id,
+                    sort_by=sort_by,
+                    sort_order=sort_order,
+                    locale=locale,
+                    count=count,
+                    after_cursor=last_cursor,
+                )
+            else:
+                return nodes
+            try:
+                resp = client.post(
+                    self.__url,
+                    headers=self.__headers,
+                    json=query,
+                    timeout=timeout,
+                )
+                if resp.status_code != 200:
+                    print(f"Failed to fetch {self.__url}, skipping...")
                     continue
-                except httpx.HTTPError as e:
-                    print(e)
+
+                data = dict(resp.json())
+                advanced_title_search = data.get("data", {}).get("advancedTitleSearch", {})
+                if advanced_title_search is None:
                     continue
+                has_next_page = advanced_title_search.get("pageInfo", {}).get("hasNextPage", False)
+                edges = advanced_title_search.get("edges", [])
+                last_cursor = advanced_title_search.get("pageInfo", {}).get("endCursor", "")
+                for edge in edges:
+                    info = edge.get("node", {}).get("title", {})
+                    imdb_id = info.get("id", None)
+                    title_text = info.get("titleText", None)
+                    if title_text is None:
+                        continue
+                    imdb_title = title_text.get("text", None)
+                    if imdb_title is None:
+                        continue
+                    title_type = info.get("titleType", None)
+                    if title_type is None:
+                        continue
+                    imdb_type = title_type.get("id", None)
+                    if imdb_type is None:
+                        continue
+                    node = {"id": imdb_id, "title": imdb_title, "type": imdb_type}
+                    nodes.append(node)
+                if has_next_page is False:
+                    break
+            except httpx.TimeoutException:
+                print(f"Request timed out, retrying in {timeout} seconds...")
+                continue
+            except httpx.HTTPError as e:
+                print(e)
+                continue
         return nodes
 
     def get_latest_hash(self) -> str:
         try:
             # Make a request to IMDb's main page or search page
-            response = httpx.get("https://www.imdb.com/search/title/", headers=self.__headers)
+            client = HttpSession.get_client()
+            response = client.get("https://www.imdb.com/search/title/", headers=self.__headers)
             # Look for the hash in the JavaScript bundles
             # This is a simplified example - you'd need to parse the JS to find the actual hash
             if "sha256Hash" in response.text:
@@ -1,7 +1,7 @@
-import time
-
 import httpx
 
+from lib.http_session import HttpSession
+
 
 class JustWatch:
     def __init__(self) -> None:
@@ -149,68 +149,68 @@ class JustWatch:
     def search_title(
         self, search_query: str, count: int = 4, language: str = "en", timeout: int = 10
     ) -> list:
-        with httpx.Client() as client:
-            try:
-                query = self.__get_search_title_query(
-                    search_query=search_query, language=language, count=count
-                )
-                if not query:
-                    raise ValueError("operationName is not valid")
-                resp = client.post(
-                    self.__url,
-                    headers=self.__headers,
-                    json=query,
-                    timeout=timeout,
-                )
-                if resp.status_code != 200:
-                    print(f"Failed to fetch {self.__url}, skipping...")
-                    return []
-                data = dict(resp.json())
-                if data is None:
-                    print(f"No results found for {search_query}, skipping...")
-                    return []
-                results = []
-                data = data.get("data", {})
-                if data is None:
-                    print(f"No results found for {search_query}, skipping...")
-                    return []
-                popular_titles = data.get("popularTitles", {})
-                if popular_titles is None:
-                    print(f"No results found for {search_query}, skipping...")
-                    return []
-                edges = popular_titles.get("edges") or []
-                for edge in edges:
-                    node = edge.get("node", {})
-                    content = node.get("content", {})
-                    imdb_id = content.get("externalIds", {}).get("imdbId", None)
-                    title = content.get("title", None)
-                    short_description = content.get("shortDescription", None)
-                    poster_url = content.get("posterUrl", None)
-                    big_poster_url = None
-                    if poster_url is not None:
-                        poster_url = poster_url.replace("{profile}", "s166").replace("{format}", "jpeg")
-                        poster_url = f"https://images.justwatch.com{poster_url}"
-                        big_poster_url = poster_url.replace("s166", "s592")
-                    content_type = node.get("objectType", None)
-                    translated = title is not None and short_description is not None
-                    result = {
-                        "imdb_id": imdb_id,
-                        "title": title,
-                        "short_description": short_description,
-                        "poster_url": poster_url,
-                        "big_poster_url": big_poster_url,
-                        "content_type": content_type,
-                        "translated": translated,
-                    }
-
-                    results.append(result)
-                return results
-            except httpx.TimeoutException:
-                print(f"Request timed out, retrying in {timeout} seconds...")
+        client = HttpSession.get_client()
+        try:
+            query = self.__get_search_title_query(
+                search_query=search_query, language=language, count=count
+            )
+            if not query:
+                raise ValueError("operationName is not valid")
+            resp = client.post(
+                self.__url,
+                headers=self.__headers,
+                json=query,
+                timeout=timeout,
+            )
+            if resp.status_code != 200:
+                print(f"Failed to fetch {self.__url}, skipping...")
                 return []
-            except httpx.HTTPError as e:
-                print(e)
+            data = dict(resp.json())
+            if data is None:
+                print(f"No results found for {search_query}, skipping...")
+                return []
+            results = []
+            data = data.get("data", {})
+            if data is None:
+                print(f"No results found for {search_query}, skipping...")
+                return []
+            popular_titles = data.get("popularTitles", {})
+            if popular_titles is None:
+                print(f"No results found for {search_query}, skipping...")
                 return []
+            edges = popular_titles.get("edges") or []
+            for edge in edges:
+                node = edge.get("node", {})
+                content = node.get("content", {})
+                imdb_id = content.get("externalIds", {}).get("imdbId", None)
+                title = content.get("title", None)
+                short_description = content.get("shortDescription", None)
+                poster_url = content.get("posterUrl", None)
+                big_poster_url = None
+                if poster_url is not None:
+                    poster_url = poster_url.replace("{profile}", "s166").replace("{format}", "jpeg")
+                    poster_url = f"https://images.justwatch.com{poster_url}"
+                    big_poster_url = poster_url.replace("s166", "s592")
+                content_type = node.get("objectType", None)
+                translated = title is not None and short_description is not None
+                result = {
+                    "imdb_id": imdb_id,
+                    "title": title,
+                    "short_description": short_description,
+                    "poster_url": poster_url,
+                    "big_poster_url": big_poster_url,
+                    "content_type": content_type,
+                    "translated": translated,
+                }
+
+                results.append(result)
+            return results
+        except httpx.TimeoutException:
+            print(f"Request timed out, retrying in {timeout} seconds...")
+            return []
+        except httpx.HTTPError as e:
+            print(e)
+            return []
 
     def request_page(
         self,
@@ -230,55 +230,54 @@ class JustWatch:
                     value = list_value
             schema_dict.update({key: value})
 
-        with httpx.Client() as client:
-            catalog_ids = []
-            for _ in range(1, pages + 1):
-                time.sleep(1)
-                try:
-                    query = self.__get_popular_titles_query(**schema_dict)
-                    if not query:
-                        raise ValueError("operationName is not valid")
-                    resp = client.post(
-                        self.__url,
-                        headers=self.__headers,
-                        json=query,
-                        timeout=timeout,
-                    )
-                    if resp.status_code != 200:
-                        print(f"Failed to fetch {self.__url}, skipping...")
-                        continue
-
-                    json = dict(resp.json())
-                    data = json.get("data", {})
-                    if data is None:
-                        print(f"No results found for {schema}, skipping...")
-                        continue
-                    popular_titles = data.get("popularTitles", {})
-                    if popular_titles is None:
-                        print(f"No results found for {schema}, skipping...")
-                        continue
-
-                    edges = popular_titles.get("edges", []) or []
+        client = HttpSession.get_client()
+        catalog_ids = []
+        for _ in range(1, pages + 1):
+            try:
+                query = self.__get_popular_titles_query(**schema_dict)
+                if not query:
+                    raise ValueError("operationName is not valid")
+                resp = client.post(
+                    self.__url,
+                    headers=self.__headers,
+                    json=query,
+                    timeout=timeout,
+                )
+                if resp.status_code != 200:
+                    print(f"Failed to fetch {self.__url}, skipping...")
+                    continue
 
-                    has_next_page = popular_titles.get("pageInfo", {}).get("hasNextPage", False)
-                    for edge in edges:
-                        schema_dict.update({"after_cursor": edge.get("cursor", "")})
-                        object_type = edge.get("node", {}).get("objectType", None)
-                        imdb_id = (
-                            edge.get("node", {}).get("content", {}).get("externalIds", {}).get("imdbId", None)
-                        )
-                        if object_type is None:
-                            continue
-                        if imdb_id == "" or imdb_id is None or imdb_id.startswith("tt") is False:
-                            continue
-                        catalog_ids.append({"imdb_id": imdb_id, "object_type": object_type})
-                    if not has_next_page:
-                        break
-                except httpx.TimeoutException:
-                    print(f"Request timed out, retrying in {timeout} seconds...")
+                json = dict(resp.json())
+                data = json.get("data", {})
+                if data is None:
+                    print(f"No results found for {schema}, skipping...")
                     continue
-                except httpx.HTTPError as e:
-                    print(e)
+                popular_titles = data.get("popularTitles", {})
+                if popular_titles is None:
+                    print(f"No results found for {schema}, skipping...")
                     continue
 
+                edges = popular_titles.get("edges", []) or []
+
+                has_next_page = popular_titles.get("pageInfo", {}).get("hasNextPage", False)
+                for edge in edges:
+                    schema_dict.update({"after_cursor": edge.get("cursor", "")})
+                    object_type = edge.get("node", {}).get("objectType", None)
+                    imdb_id = (
+                        edge.get("node", {}).get("content", {}).get("externalIds", {}).get("imdbId", None)
+                    )
+                    if object_type is None:
+                        continue
+                    if imdb_id == "" or imdb_id is None or imdb_id.startswith("tt") is False:
+                        continue
+                    catalog_ids.append({"imdb_id": imdb_id, "object_type": object_type})
+                if not has_next_page:
+                    break
+            except httpx.TimeoutException:
+                print(f"Request timed out, retrying in {timeout} seconds...")
+                continue
+            except httpx.HTTPError as e:
+                print(e)
+                continue
+
         return catalog_ids
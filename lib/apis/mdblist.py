@@ -1,6 +1,5 @@
-import httpx
-
 from lib import env, log
+from lib.http_session import HttpSession
 
 
 class MDBList:
@@ -27,14 +26,14 @@ class MDBList:
         timeout: int = 20,
     ) -> list:
         url = self.__url + schema + f"?apikey={self.__api_key}"
-        with httpx.Client() as client:
-            resp = client.get(
-                url,
-                headers=self.__headers,
-                timeout=timeout,
-            )
-            if resp.status_code != 200:
-                log.error(f"Failed to fetch {url}, error: {resp.text}")
-                return []
-            nodes = resp.json()
+        client = HttpSession.get_client()
+        resp = client.get(
+            url,
+            headers=self.__headers,
+            timeout=timeout,
+        )
+        if resp.status_code != 200:
+            log.error(f"Failed to fetch {url}, error: {resp.text}")
+            return []
+        nodes = resp.json()
         return nodes
@@ -1,14 +1,15 @@
+import asyncio
 import json
-from copy import deepcopy
 
-import httpx
-
-from lib import log, utils
+from lib import log
+from lib.http_session import HttpSession
+from lib.ttl_cache import TTLCache
 
 
 class RPDB:
     def __init__(self):
         self.__url = "https://api.ratingposterdb.com"
+        self.__quotas: TTLCache = TTLCache(ttl=60 * 10, stale_ttl=60 * 60 * 24)
 
     def validate_api_key(self, api_key) -> bool:
         url = f"{self.__url}/{api_key}/isValid"
@@ -16,27 +17,29 @@ class RPDB:
             return False
 
         try:
-            with httpx.Client() as client:
-                response = client.get(url)
-                return response.status_code == 200
+            client = HttpSession.get_client()
+            response = client.get(url)
+            return response.status_code == 200
         except Exception as e:
             log.info(e)
         return False
 
-    def check_request_left(self, api_key: str) -> int:
+    def check_request_left(self, api_key: str) -> int | None:
+        """Requests left for the key, None when RPDB could not tell."""
         check_limit_url = f"{self.__url}/{api_key}/requests"
         try:
-            with httpx.Client() as client:
-                response = client.get(check_limit_url)
-                if response.status_code == 200:
-                    buffer = response.content
-                    result: dict = json.loads(buffer)
-                    req: int = result.get("req", None)
-                    limit: int = result.get("limit", None)
-                    return limit - req
+            client = HttpSession.get_client()
+            response = client.get(check_limit_url)
+            if response.status_code == 200:
+                buffer = response.content
+                result: dict = json.loads(buffer)
+                req: int = result.get("req", None)
+                limit: int = result.get("limit", None)
+                return max(limit - req, 0)
+            log.info(f"::=>[RPDB] Quota check failed with status {response.status_code}")
         except Exception as e:
             log.info(e)
-        return 0
+        return None
 
     def get_poster(self, imdb_id: str, api_key: str, lang="en") -> str | None:
         url = f"{self.__url}/{api_key}/imdb/poster-default/{imdb_id}.jpg?fallback=true"
@@ -44,18 +47,26 @@ class RPDB:
             url = f"{url}&lang={lang}"
         return url
 
+    async def has_requests_left(self, api_key: str, count: int) -> bool:
+        """Check a key against its cached quota, refreshed in the background. Failed checks count as no quota."""
+
+        def fetch_quota() -> dict | None:
+            left = self.check_request_left(api_key=api_key)
+            return {"left": left} if left is not None else None
+
+        quota = await self.__quotas.get(api_key, lambda: asyncio.to_thread(fetch_quota))
+        return quota is not None and quota["left"] >= count
+
+    def use_requests(self, api_key: str, count: int):
+        """Take `count` requests from the cached quota of a key, once its posters are actually sent."""
+        quota = self.__quotas.peek(api_key)
+        if quota is not None:
+            quota["left"] -= count
+
     def replace_posters(self, metas: list[dict], api_key: str, lang="en") -> list[dict]:
-        new_metas = deepcopy(metas)
-        if self.check_request_left(api_key=api_key) < len(metas):
-            return metas
-
-        def __get_poster(item: dict, idx: int, worker_id: int, **kwargs) -> dict:
-            if item is None:
-                return None
-            imdb_id = item.get("id", None)
-            api_key = kwargs.get("api_key", None)
-            lang = kwargs.get("lang", "en")
-            item.update({"poster": self.get_poster(imdb_id=imdb_id, api_key=api_key, lang=lang)})
-            return item
-
-        return utils.parallel_for(__get_poster, items=new_metas, api_key=api_key, lang=lang)
+        """Return shallow overlays of `metas` with RPDB posters, leaving the given metas untouched."""
+        return [
+            {**item, "poster": self.get_poster(imdb_id=item.get("id", None), api_key=api_key, lang=lang)}
+            for item in metas
+            if item is not None
+        ]
@@ -1,8 +1,7 @@
 import json
 
-import httpx
-
 from lib import env, log
+from lib.http_session import HttpSession
 from lib.model.catalog_type import CatalogType
 
 
@@ -27,15 +26,14 @@ class TMDB:
         return self.__api_key
 
     def __request(self, url: str) -> dict | None:
-        with httpx.Client() as client:
-            try:
-                response = client.get(url, headers=self.__headers, timeout=1.5)
-                if response.status_code == 200:
-                    buffer = response.content
-                    return json.loads(buffer)
-                log.info(f"Failed to fetch {url}, skipping...")
-            except Exception as e:
-                log.info(e)
+        try:
+            response = HttpSession.get_client().get(url, headers=self.__headers, timeout=1.5)
+            if response.status_code == 200:
+                buffer = response.content
+                return json.loads(buffer)
+            log.info(f"Failed to fetch {url}, skipping...")
+        except Exception as e:
+            log.info(e)
         return None
 
     def request_page(self, url: str) -> list:
@@ -1,8 +1,7 @@
 import json
 
-import httpx
-
 from lib import env, log
+from lib.http_session import HttpSession
 
 
 class Trakt:
@@ -28,17 +27,17 @@ class Trakt:
             "redirect_uri": "urn:ietf:wg:oauth:2.0:oob",
             "grant_type": "authorization_code",
         }
-        with httpx.Client() as client:
-            try:
-                response = client.post(token_url, json=payload, timeout=3)
-                if response.status_code == 200:
-                    buffer = response.content
-                    if buffer is None:
-                        return None
-                    access_token = json.loads(buffer).get("access_token", None)
-                    return access_token
-            except Exception as e:
-                log.info(e)
+        client = HttpSession.get_client()
+        try:
+            response = client.post(token_url, json=payload, timeout=3)
+            if response.status_code == 200:
+                buffer = response.content
+                if buffer is None:
+                    return None
+                access_token = json.loads(buffer).get("access_token", None)
+                return access_token
+        except Exception as e:
+            log.info(e)
         return None
 
     def __request(self, url: str, access_token: str, timeout: int) -> dict | None:
@@ -56,15 +55,15 @@ class Trakt:
             "page": 1,
             "limit": 100,  # Set pagination limit to 100
         }
-        with httpx.Client() as client:
-            try:
-                response = client.get(url, headers=headers, params=params, timeout=3)
-                if response.status_code == 200:
-                    buffer = response.content
-                    return json.loads(buffer)
-                log.info(f"Failed to fetch {url}, skipping...")
-            except Exception as e:
-                log.info(e)
+        client = HttpSession.get_client()
+        try:
+            response = client.get(url, headers=headers, params=params, timeout=3)
+            if response.status_code == 200:
+                buffer = response.content
+                return json.loads(buffer)
+            log.info(f"Failed to fetch {url}, skipping...")
+        except Exception as e:
+            log.info(e)
         return None
 
     def request_page(self, schema: str, s_type: str, timeout: int = 20) -> list:
@@ -0,0 +1,113 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+from lib.providers.catalog_info import ImdbInfo
+from lib.snapshot import SnapshotCatalog
+
+MAX_CACHED_FILTERS = 256
+
+
+class CatalogIndex:
+    """Columnar view of one catalog (genre bitmasks and years), filtered with vectorized mask operations."""
+
+    def __init__(self, items: Sequence[ImdbInfo]):
+        self.__items: Sequence[ImdbInfo] = items
+        self.__size: int = len(items)
+        if isinstance(items, SnapshotCatalog):
+            # Snapshot catalogs already keep these columns, their items are not decoded
+            self.__genre_masks: np.ndarray = items.genre_masks
+            self.__years: np.ndarray = items.years
+        else:
+            masks = [item.genre_mask for item in items]
+            # More than 64 distinct genres no longer fit a machine word, fall back to Python ints
+            dtype = np.uint64 if max(masks, default=0).bit_length() <= 64 else object
+            self.__genre_masks = np.array(masks, dtype=dtype)
+            self.__years = np.fromiter((item.year_number for item in items), dtype=np.int32, count=self.__size)
+        self.__positions: dict[tuple, np.ndarray] = {}
+
+    @property
+    def genres(self) -> list[str]:
+        if self.__size == 0:
+            return []
+        return list(ImdbInfo.get_genre_names(int(np.bitwise_or.reduce(self.__genre_masks))))
+
+    @property
+    def years(self) -> list[str]:
+        return [str(year) for year in np.unique(self.__years).tolist() if year]
+
+    def has_year(self, year: int) -> bool:
+        return bool(np.any(self.__years == year))
+
+    def is_valid_for(self, items: Sequence[ImdbInfo]) -> bool:
+        return self.__items is items and self.__size == len(items)
+
+    def get_positions(
+        self,
+        genre: str | None = None,
+        year: str | None = None,
+        genres_any: list[str] | None = None,
+        genres_all: list[str] | None = None,
+        year_from: int | None = None,
+        year_to: int | None = None,
+    ) -> np.ndarray | range:
+        """Ordered positions of the items matching every given filter, year bounds being inclusive."""
+        key = (genre, year, tuple(genres_any or ()), tuple(genres_all or ()), year_from, year_to)
+        if key == (None, None, (), (), None, None):
+            return range(self.__size)
+        positions = self.__positions.get(key)
+        if positions is not None:
+            return positions
+
+        selected = np.ones(self.__size, dtype=bool)
+        if genre is not None:
+            selected &= self.__match_genres([genre], match_all=True)
+        if genres_any:
+            selected &= self.__match_genres(genres_any, match_all=False)
+        if genres_all:
+            selected &= self.__match_genres(genres_all, match_all=True)
+        if year is not None:
+            selected &= self.__years == (int(year) if year.isascii() and year.isdigit() else -1)
+        if year_from is not None:
+            selected &= self.__years >= year_from
+        if year_to is not None:
+            selected &= self.__years <= year_to
+        positions = np.flatnonzero(selected)
+
+        if len(self.__positions) >= MAX_CACHED_FILTERS:
+            self.__positions.clear()
+        self.__positions[key] = positions
+        return positions
+
+    def get_items(
+        self, genre: str | None = None, year: str | None = None, skip: int = 0, limit: int | None = None, **filters
+    ) -> list[ImdbInfo]:
+        positions = self.get_positions(genre=genre, year=year, **filters)
+        end = len(positions) if limit is None else skip + limit
+        page = positions[skip:end]
+        if isinstance(page, np.ndarray):
+            page = page.tolist()
+        return [self.__items[position] for position in page]
+
+    def __match_genres(self, genres: list[str], match_all: bool) -> np.ndarray:
+        wanted = 0
+        for genre in genres:
+            bit = ImdbInfo.find_genre_bit(genre)
+            if bit is None:
+                if match_all:
+                    return np.zeros(self.__size, dtype=bool)
+                continue
+            wanted |= 1 << bit
+        if wanted == 0:
+            return np.zeros(self.__size, dtype=bool)
+        if self.__genre_masks.dtype != object:
+            # Genre bits are numbered process-wide, bits past this catalog's widest mask are set on none of its items
+            if wanted.bit_length() > 64:
+                if match_all:
+                    return np.zeros(self.__size, dtype=bool)
+                wanted &= (1 << 64) - 1
+                if wanted == 0:
+                    return np.zeros(self.__size, dtype=bool)
+            wanted = self.__genre_masks.dtype.type(wanted)
+        matched = self.__genre_masks & wanted
+        return matched == wanted if match_all else matched != 0
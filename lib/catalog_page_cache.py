@@ -0,0 +1,217 @@
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import orjson
+
+from lib import env
+from lib.utils import compute_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGE_SIZE = 25
+# Rough cost of one poster span, a tuple of two ints, an id and a key prefix
+POSTER_SPAN_BYTES = 120
+# Stands in for a poster while a meta is serialized, to find where its value lands
+POSTER_MARK = "\x00poster\x00"
+POSTER_MARK_BYTES = orjson.dumps(POSTER_MARK)
+
+
+class CachedPage:
+    def __init__(self, metas: list[dict]):
+        parts = [b'{"metas":[']
+        offset = len(parts[0])
+        poster_spans = []
+        for idx, meta in enumerate(metas):
+            if idx > 0:
+                parts.append(b",")
+                offset += 1
+            meta_body, start, end, prefix = self.__render_meta(meta)
+            poster_spans.append((offset + start, offset + end, meta.get("id", None), prefix))
+            parts.append(meta_body)
+            offset += len(meta_body)
+        parts.append(b'],"total":%d}' % len(metas))
+
+        body = b"".join(parts)
+        self.__body: bytes = body
+        self.__size: int = len(metas)
+        self.__poster_spans: list[tuple[int, int, str | None, bytes]] = poster_spans
+        self.__etag: str = compute_etag(body)
+        # Compressed copies are made on first use, most pages are only ever asked for in one encoding
+        self.__gzip: bytes | None = None
+        self.__brotli: bytes | None = None
+        self.__on_grow: Callable[["CachedPage", int], None] | None = None
+
+    @property
+    def body(self) -> bytes:
+        return self.__body
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the page: its body, every compressed variant and the poster spans."""
+        size = len(self.__body) + len(self.__poster_spans) * POSTER_SPAN_BYTES
+        if self.__gzip is not None:
+            size += len(self.__gzip)
+        if self.__brotli is not None:
+            size += len(self.__brotli)
+        return size
+
+    def bind(self, on_grow: Callable[["CachedPage", int], None] | None):
+        """Report the size of compressed copies made later to the cache holding the page."""
+        self.__on_grow = on_grow
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def etag(self) -> str:
+        return self.__etag
+
+    def encode(self, accept_encoding: str) -> tuple[bytes, str | None]:
+        if brotli is not None and "br" in accept_encoding:
+            if self.__brotli is None:
+                self.__brotli = brotli.compress(self.__body, quality=5)
+                self.__grow(len(self.__brotli))
+            return self.__brotli, "br"
+        if "gzip" in accept_encoding:
+            if self.__gzip is None:
+                self.__gzip = gzip.compress(self.__body, compresslevel=6)
+                self.__grow(len(self.__gzip))
+            return self.__gzip, "gzip"
+        return self.__body, None
+
+    def __grow(self, size: int):
+        on_grow = self.__on_grow
+        if on_grow is not None:
+            on_grow(self, size)
+
+    def with_posters(self, poster_for: Callable[[str | None], str]) -> bytes:
+        """The bytes of `RPDB.replace_posters` of the metas, spliced into the cached body."""
+        body = memoryview(self.__body)
+        chunks = []
+        last = 0
+        for start, end, imdb_id, prefix in self.__poster_spans:
+            chunks.append(body[last:start])
+            chunks.append(prefix)
+            chunks.append(orjson.dumps(poster_for(imdb_id)))
+            last = end
+        chunks.append(body[last:])
+        return b"".join(chunks)
+
+    @staticmethod
+    def __render_meta(meta: dict) -> tuple[bytes, int, int, bytes]:
+        """The serialized meta, the span of its poster value and what precedes a poster it does not have."""
+        if "poster" not in meta:
+            meta_body = orjson.dumps(meta)
+            end = len(meta_body) - 1
+            return meta_body, end, end, b',"poster":' if len(meta) > 0 else b'"poster":'
+        marked = orjson.dumps({**meta, "poster": POSTER_MARK})
+        start = marked.index(POSTER_MARK_BYTES)
+        value = orjson.dumps(meta["poster"])
+        meta_body = marked[:start] + value + marked[start + len(POSTER_MARK_BYTES):]
+        return meta_body, start, start + len(value), b""
+
+
+class PageView:
+    """A cached page as served to one client, optionally with posters rewritten for that client."""
+
+    def __init__(
+        self,
+        page: CachedPage,
+        poster_for: Callable[[str | None], str] | None = None,
+        variant: str = "",
+        on_render: Callable[[], None] | None = None,
+    ):
+        self.__page: CachedPage = page
+        self.__poster_for: Callable[[str | None], str] | None = poster_for
+        # Called when the rewritten page is actually rendered, a 304 never gets that far
+        self.__on_render: Callable[[], None] | None = on_render
+        self.__etag: str = page.etag if poster_for is None else compute_etag(f"{page.etag}{variant}".encode())
+
+    @property
+    def etag(self) -> str:
+        return self.__etag
+
+    def encode(self, accept_encoding: str) -> tuple[bytes, str | None]:
+        if self.__poster_for is None:
+            return self.__page.encode(accept_encoding)
+        if self.__on_render is not None:
+            self.__on_render()
+        return self.__page.with_posters(self.__poster_for), None
+
+
+class CatalogPageCache:
+    """Rendered catalog pages of one catalog version keyed by (catalog id, genre, skip), an LRU bounded in bytes."""
+
+    def __init__(self, version: int = 0, max_bytes: int | None = None):
+        self.__version: int = version
+        self.__max_bytes: int = max_bytes if max_bytes is not None else env.PAGE_CACHE_MAX_MB * 1024 * 1024
+        self.__lock = threading.Lock()
+        self.__pages: OrderedDict[tuple[str, str | None, int], tuple[CachedPage, int]] = OrderedDict()
+        self.__bytes: int = 0
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def nbytes(self) -> int:
+        return self.__bytes
+
+    @property
+    def max_bytes(self) -> int:
+        return self.__max_bytes
+
+    def __len__(self) -> int:
+        return len(self.__pages)
+
+    def get(self, catalog_id: str, genre: str | None, skip: int) -> CachedPage | None:
+        key = (catalog_id, genre, skip)
+        with self.__lock:
+            entry = self.__pages.get(key)
+            if entry is None:
+                return None
+            self.__pages.move_to_end(key)
+            return entry[0]
+
+    def put(self, catalog_id: str, genre: str | None, skip: int, metas: list[dict]) -> CachedPage:
+        key = (catalog_id, genre, skip)
+        page = CachedPage(metas)
+        size = page.nbytes
+        with self.__lock:
+            previous = self.__pages.pop(key, None)
+            if previous is not None:
+                previous[0].bind(None)
+                self.__bytes -= previous[1]
+            if size <= self.__max_bytes:
+                page.bind(lambda grown, added: self.__on_grow(key, grown, added))
+                self.__pages[key] = (page, size)
+                self.__bytes += size
+            self.__evict(self.__max_bytes)
+        return page
+
+    def trim(self, max_bytes: int):
+        """Drop the least recently served pages until at most `max_bytes` are held."""
+        with self.__lock:
+            self.__evict(max_bytes)
+
+    def __on_grow(self, key: tuple[str, str | None, int], page: CachedPage, added: int):
+        with self.__lock:
+            entry = self.__pages.get(key)
+            # Pages evicted in the meantime are no longer counted
+            if entry is None or entry[0] is not page:
+                return
+            self.__pages[key] = (page, entry[1] + added)
+            self.__bytes += added
+            self.__evict(self.__max_bytes)
+
+    def __evict(self, max_bytes: int):
+        while self.__bytes > max_bytes and self.__pages:
+            _, (page, size) = self.__pages.popitem(last=False)
+            page.bind(None)
+            self.__bytes -= size
@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import Counter
+
+import orjson
+
+from lib import log
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Genres come from the request, so only this many catalog and genre pairs are counted
+MAX_TRACKED_CATALOGS = 10000
+
+
+class CatalogPopularity:
+    """Catalog requests counted by every worker and merged into one file kept across restarts."""
+
+    def __init__(self, path: str):
+        self.__path: str = path
+        self.__lock = threading.Lock()
+        self.__totals: Counter[tuple[str, str | None]] = self.__read()
+        self.__pending: Counter[tuple[str, str | None]] = Counter()
+
+    def count(self, catalog_id: str, genre: str | None):
+        key = (catalog_id, genre)
+        with self.__lock:
+            tracked = len(self.__totals) + len(self.__pending)
+            if key in self.__pending or key in self.__totals or tracked < MAX_TRACKED_CATALOGS:
+                self.__pending[key] += 1
+
+    def most_common(self) -> list[tuple[str, str | None]]:
+        with self.__lock:
+            counts = self.__totals + self.__pending
+        return [key for key, _ in counts.most_common()]
+
+    def sync(self):
+        """Add the counts of this worker to the shared file and read back the totals of all workers."""
+        with self.__lock:
+            pending = self.__pending
+            self.__pending = Counter()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.__path)), exist_ok=True)
+            with open(f"{self.__path}.lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                totals = self.__read()
+                totals.update(pending)
+                totals = Counter(dict(totals.most_common(MAX_TRACKED_CATALOGS)))
+                if pending:
+                    self.__write(totals)
+        except OSError as e:
+            log.error(f"::=>[Popularity] Failed to sync {self.__path}: {e}")
+            with self.__lock:
+                self.__pending.update(pending)
+            return
+        with self.__lock:
+            self.__totals = totals
+
+    def __read(self) -> Counter:
+        try:
+            with open(self.__path, "rb") as file:
+                entries = orjson.loads(file.read())
+        except FileNotFoundError:
+            return Counter()
+        except (OSError, orjson.JSONDecodeError) as e:
+            log.error(f"::=>[Popularity] Failed to read {self.__path}: {e}")
+            return Counter()
+        return Counter({(catalog_id, genre): count for catalog_id, genre, count in entries})
+
+    def __write(self, totals: Counter):
+        tmp_path = f"{self.__path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(orjson.dumps([[catalog_id, genre, count] for (catalog_id, genre), count in totals.items()]))
+        os.replace(tmp_path, self.__path)
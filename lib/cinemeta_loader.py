@@ -0,0 +1,83 @@
+import asyncio
+
+from lib import log, utils
+from lib.apis.cinemeta import Cinemeta
+from lib.meta_loader import MetaLoader
+
+# Ids per Cinemeta lastVideosIds request, the size catalogs used before they shared their fetches
+BATCH_SIZE = 15
+# Window for the catalogs in flight to add their ids to the next batch
+BATCH_DELAY = 0.05
+
+
+class CinemetaLoader:
+    """Build-scoped Cinemeta fetches, batching the ids of every catalog in flight and fetching each id once."""
+
+    def __init__(self, cinemeta: Cinemeta | None = None):
+        self.__cinemeta: Cinemeta = cinemeta or Cinemeta()
+        self.__metas: dict[str, dict[str, dict | None]] = {}
+        self.__loaders: dict[str, MetaLoader] = {}
+        self.__requested_ids: int = 0
+        self.__fetched_ids: int = 0
+        self.__batches: int = 0
+        # Ids of failed batches are not kept in the metas, so later catalogs fetch them again
+        self.__failed_ids: set[tuple[str, str]] = set()
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "requested_ids": self.__requested_ids,
+            "fetched_ids": self.__fetched_ids,
+            "batches": self.__batches,
+        }
+
+    async def get_metas(self, ids: list[str], s_type: str) -> list[dict]:
+        """Metas found for the ids of one catalog, shared with other catalogs and not to be mutated."""
+        ids = list(dict.fromkeys(ids))
+        self.__requested_ids += len(ids)
+        metas = self.__metas.setdefault(s_type, {})
+        missing = [imdb_id for imdb_id in ids if imdb_id not in metas]
+        if len(missing) > 0:
+            await self.__get_loader(s_type).load_many(missing)
+        failed = [imdb_id for imdb_id in ids if imdb_id not in metas]
+        if len(failed) > 0:
+            log.warning(f"::=>[Build] Missing {len(failed)} of {len(ids)} Cinemeta {s_type} metas")
+            self.__failed_ids.update((s_type, imdb_id) for imdb_id in failed)
+        return [metas[imdb_id] for imdb_id in ids if metas.get(imdb_id) is not None]
+
+    def has_failed(self, imdb_id: str, s_type: str) -> bool:
+        """Whether some catalog of this build was built without the meta of the id."""
+        return (s_type, imdb_id) in self.__failed_ids
+
+    def __get_loader(self, s_type: str) -> MetaLoader:
+        loader = self.__loaders.get(s_type)
+        if loader is None:
+
+            async def fetch(ids: list[str]) -> dict:
+                return await self.__fetch(ids, s_type)
+
+            loader = MetaLoader(fetch, delay=BATCH_DELAY, max_batch_size=BATCH_SIZE)
+            self.__loaders[s_type] = loader
+        return loader
+
+    async def __fetch(self, ids: list[str], s_type: str) -> dict:
+        chunks = list(utils.divide_chunks(ids, BATCH_SIZE))
+        self.__batches += len(chunks)
+        self.__fetched_ids += len(ids)
+        results = await asyncio.gather(
+            *(self.__cinemeta.fetch_metas_async(chunk, s_type=s_type) for chunk in chunks), return_exceptions=True
+        )
+        # Results are kept before the loader forgets the ids, ids a successful batch had no meta for are not
+        # asked again either
+        metas = self.__metas[s_type]
+        for chunk, chunk_metas in zip(chunks, results):
+            if isinstance(chunk_metas, Exception):
+                log.error(f"::=>[Build] Failed to fetch {len(chunk)} Cinemeta metas: {chunk_metas}")
+                continue
+            for imdb_id in chunk:
+                metas.setdefault(imdb_id, None)
+            for meta in chunk_metas:
+                imdb_id = meta.get("imdb_id", "")
+                if imdb_id in metas:
+                    metas[imdb_id] = meta
+        return {imdb_id: metas.get(imdb_id) for imdb_id in ids}
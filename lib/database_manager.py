@@ -1,7 +1,16 @@
-from supabase import create_client
+import asyncio
+import os
+import threading
+import time
+from typing import Callable
+
+from supabase import AsyncClient, AsyncClientOptions, acreate_client, create_client
 
 from lib import env, log
+from lib.catalog_index import CatalogIndex
+from lib.metrics import SUPABASE_REQUESTS
 from lib.providers.catalog_info import ImdbInfo
+from lib.snapshot import Snapshot, SnapshotCatalog, SnapshotMetas, write_snapshot
 from lib.utils import parallel_for
 
 from datetime import datetime
@@ -12,6 +21,10 @@ class DatabaseManager:
     _instance = None
     _initialized = False
 
+    # Request path queries share one pooled HTTP/2 session per worker
+    ASYNC_TIMEOUT = 10
+    ASYNC_MAX_CONCURRENCY = 10
+
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
@@ -21,22 +34,177 @@ class DatabaseManager:
         # Only initialize once
         if not DatabaseManager._initialized:
             self.supabase = create_client(env.SUPABASE_URL, env.SUPABASE_KEY)
+            self.__async_loop: asyncio.AbstractEventLoop | None = None
+            self.__async_supabase: AsyncClient | None = None
+            self.__async_lock: asyncio.Lock | None = None
+            self.__async_semaphore: asyncio.Semaphore | None = None
+
+            self.__snapshot_lock = threading.Lock()
+            self.__listeners_lock = threading.Lock()
+            self.__snapshot_listeners: list[Callable[[], None]] = []
+            self.__snapshot: Snapshot | None = self.__open_snapshot()
+            self.__booted_from_snapshot: bool = self.__snapshot is not None
+
+            if self.__snapshot is not None:
+                # Boot from the local snapshot, the leader reconciles it with Supabase in the background
+                manifest = self.__snapshot.manifest
+                catalogs = self.__snapshot.get_catalogs()
+            else:
+                try:
+                    _ = self.__execute(self.supabase.rpc('manifest'))
+                    log.info("Database connection successful")
+                except Exception as e:
+                    log.warning(f"Database health check failed (this is normal on first run): {str(e)}")
+
+                # Load all data into memory at startup
+                manifest = self.get_manifest()
+                catalogs = self.get_catalogs()
 
-            try:
-                _ = self.supabase.rpc('manifest').execute()
-                log.info("Database connection successful")
-            except Exception as e:
-                log.warning(f"Database health check failed (this is normal on first run): {str(e)}")
-
-            # Load all data into memory at startup
             self.__cached_data = {
-                "manifest": self.get_manifest(),
-                "catalogs": self.get_catalogs(),
-                "tmdb_ids": self.get_tmdb_ids(),
-                "metas": {},
+                "manifest": manifest,
+                "catalogs": catalogs,
+                "catalog_indexes": self.__build_catalog_indexes(catalogs),
+                # Only builds need the tmdb id mapping, it is loaded on first use
+                "tmdb_ids": None,
+                # Metas of the last published snapshot are shared with every worker on the host
+                "metas": SnapshotMetas(self.__snapshot),
             }
+            if self.__snapshot is None and len(catalogs) > 0:
+                self.publish_snapshot()
+            self.__snapshot_watcher = threading.Thread(
+                name="Snapshot Watcher", target=self.__background_snapshot_watcher, daemon=True
+            )
+            self.__snapshot_watcher.start()
             DatabaseManager._initialized = True
 
+    def __build_catalog_indexes(self, catalogs: dict) -> dict[str, CatalogIndex]:
+        indexes = {}
+        for key, value in catalogs.items():
+            indexes[key] = CatalogIndex(value.get("data") or [])
+        return indexes
+
+    def __open_snapshot(self) -> Snapshot | None:
+        if not os.path.exists(env.SNAPSHOT_PATH):
+            return None
+        try:
+            snapshot = Snapshot(env.SNAPSHOT_PATH)
+            log.info(f"::=>[Snapshot] Mapped version {snapshot.version} with {snapshot.meta_count} metas")
+            return snapshot
+        except Exception as e:
+            log.error(f"Failed to open snapshot {env.SNAPSHOT_PATH}: {e}")
+            return None
+
+    def __swap_data(self, manifest: dict, catalogs: dict, metas: SnapshotMetas, snapshot: Snapshot | None):
+        # Readers hold on to whatever they already read, so the previous version stays intact for them
+        self.__snapshot = snapshot
+        self.__cached_data = {
+            **self.__cached_data,
+            "manifest": manifest,
+            "catalogs": catalogs,
+            "catalog_indexes": self.__build_catalog_indexes(catalogs),
+            "metas": metas,
+        }
+
+    def __notify_snapshot_listeners(self):
+        # Runs outside the snapshot lock, one swap at a time so the last notified listener sees the latest data
+        with self.__listeners_lock:
+            for listener in self.__snapshot_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    log.error(f"Snapshot listener failed: {e}")
+
+    def __swap_snapshot(self, snapshot: Snapshot):
+        self.__swap_data(snapshot.manifest, snapshot.get_catalogs(), SnapshotMetas(snapshot), snapshot)
+
+    def publish_snapshot(
+        self, manifest: dict | None = None, catalogs: dict | None = None, metas: dict | None = None
+    ) -> bool:
+        """Swap in new data over the current one, False when it could only be kept in this process memory."""
+        # Published catalogs are served as they are, callers must not mutate them afterwards
+        with self.__snapshot_lock:
+            published = self.__publish_snapshot(manifest, catalogs, metas)
+        self.__notify_snapshot_listeners()
+        return published
+
+    def __publish_snapshot(self, manifest: dict | None, catalogs: dict | None, metas: dict | None) -> bool:
+        manifest = manifest if manifest is not None else self.cached_manifest
+        catalogs = catalogs if catalogs is not None else self.cached_catalogs
+        next_metas = self.cached_metas.with_overlay(metas or {})
+        try:
+            version = write_snapshot(env.SNAPSHOT_PATH, manifest, catalogs, next_metas)
+            snapshot = Snapshot(env.SNAPSHOT_PATH)
+        except Exception as e:
+            log.error(f"Failed to publish snapshot: {e}")
+            self.__swap_data(manifest, catalogs, next_metas.bounded(), self.__snapshot)
+            return False
+        self.__swap_snapshot(snapshot)
+        log.info(f"::=>[Snapshot] Published version {version}")
+        return True
+
+    def reload_snapshot(self) -> bool:
+        """Map the snapshot file if another process has published a newer version."""
+        with self.__snapshot_lock:
+            reloaded = self.__reload_snapshot()
+        if reloaded:
+            self.__notify_snapshot_listeners()
+        return reloaded
+
+    def __reload_snapshot(self) -> bool:
+        try:
+            stat = os.stat(env.SNAPSHOT_PATH)
+        except FileNotFoundError:
+            return False
+        current = self.__snapshot
+        if current is not None and current.file_id == (stat.st_ino, stat.st_mtime_ns):
+            return False
+        snapshot = self.__open_snapshot()
+        if snapshot is None or (current is not None and snapshot.version <= current.version):
+            return False
+        self.__swap_snapshot(snapshot)
+        return True
+
+    def reconcile_snapshot(self) -> bool:
+        """Publish the Supabase manifest and catalogs when they differ from the ones booted from disk."""
+        if env.SKIP_DB_UPDATE:
+            # Local builds are never uploaded, Supabase would only roll them back
+            return False
+        manifest = self.get_manifest()
+        catalogs = self.get_catalogs()
+        if not manifest or not catalogs:
+            log.warning("::=>[Snapshot] Supabase returned no data, keeping the local snapshot")
+            return False
+        if manifest == self.cached_manifest and self.__get_catalog_rows(catalogs) == self.__get_catalog_rows(
+            self.cached_catalogs
+        ):
+            log.info(f"::=>[Snapshot] Version {self.snapshot_version} is up to date with Supabase")
+            return False
+        log.info("::=>[Snapshot] Local snapshot is stale, publishing Supabase data")
+        return self.publish_snapshot(manifest=manifest, catalogs=catalogs)
+
+    @staticmethod
+    def __get_catalog_rows(catalogs: dict) -> dict[str, list[tuple]]:
+        rows = {}
+        for key, value in catalogs.items():
+            items = value.get("data") or []
+            # Snapshots keep genres as bitmasks, so their order is not preserved
+            rows[key] = [
+                (item.id, item.type, sorted(genre for genre in item.genres or [] if genre), item.year or "")
+                for item in items
+            ]
+        return rows
+
+    def add_snapshot_listener(self, listener: Callable[[], None]):
+        self.__snapshot_listeners.append(listener)
+
+    def __background_snapshot_watcher(self):
+        while True:
+            time.sleep(env.SNAPSHOT_POLL_INTERVAL)
+            try:
+                self.reload_snapshot()
+            except Exception as e:
+                log.error(f"Failed to reload snapshot: {e}")
+
     def __db_update_changes(self, table_name: str, new_items: dict) -> bool:
         try:
             existing_items = self.__cached_data.get(table_name, {})
@@ -61,7 +229,7 @@ class DatabaseManager:
                     "inserted_keys": list(keys_to_insert), # Add ordered changes
                     "timestamp": datetime.now().isoformat()
                 }
-                self.supabase.table("changes").insert(change_record).execute()
+                self.__execute(self.supabase.table("changes").insert(change_record))
 
             return True
 
@@ -71,7 +239,11 @@ class DatabaseManager:
 
     @property
     def cached_tmdb_ids(self) -> dict:
-        return self.__cached_data["tmdb_ids"]
+        tmdb_ids = self.__cached_data["tmdb_ids"]
+        if tmdb_ids is None:
+            tmdb_ids = self.get_tmdb_ids()
+            self.__cached_data["tmdb_ids"] = tmdb_ids
+        return tmdb_ids
 
     @property
     def cached_manifest(self) -> dict:
@@ -82,16 +254,45 @@ class DatabaseManager:
         return self.__cached_data["catalogs"]
 
     @property
-    def cached_metas(self) -> dict:
+    def cached_metas(self) -> SnapshotMetas:
         return self.__cached_data["metas"]
 
+    @property
+    def meta_stats(self) -> dict:
+        return self.cached_metas.stats
+
+    @property
+    def snapshot_version(self) -> int:
+        return self.__snapshot.version if self.__snapshot is not None else 0
+
+    @property
+    def snapshot_created_at(self) -> datetime | None:
+        return datetime.fromisoformat(self.__snapshot.created_at) if self.__snapshot is not None else None
+
+    @property
+    def booted_from_snapshot(self) -> bool:
+        return self.__booted_from_snapshot
+
+    def get_catalog_index(self, catalog_id: str) -> CatalogIndex | None:
+        catalog = self.cached_catalogs.get(catalog_id)
+        if catalog is None:
+            return None
+        items = catalog.get("data") or []
+        indexes = self.__cached_data["catalog_indexes"]
+        index = indexes.get(catalog_id)
+        # Catalogs replaced in place by the builder get their index rebuilt on first use
+        if index is None or not index.is_valid_for(items):
+            index = CatalogIndex(items)
+            indexes[catalog_id] = index
+        return index
+
     def get_tmdb_ids(self) -> dict:
         try:
             all_tmdb_ids = {}
             page_size = 1000
 
             try:
-                total_items = self.supabase.table("tmdb_ids").select("key", count='exact').execute().count
+                total_items = self.__execute(self.supabase.table("tmdb_ids").select("key", count='exact')).count
             except Exception as e:
                 log.warning(f"Failed to get exact count for tmdb_ids, using pagination fallback: {e}")
                 total_items = page_size
@@ -104,10 +305,10 @@ class DatabaseManager:
                 max_retries = 3
                 for attempt in range(max_retries):
                     try:
-                        response = self.supabase.table("tmdb_ids") \
+                        query = self.supabase.table("tmdb_ids") \
                             .select("key, value") \
-                            .range(start, end) \
-                            .execute()
+                            .range(start, end)
+                        response = self.__execute(query)
                         result = {item['key']: item['value'] for item in response.data}
                         # If we got no results and we're using the fallback, we've reached the end
                         if not result and total_items == page_size:
@@ -132,7 +333,7 @@ class DatabaseManager:
 
     def get_manifest(self) -> dict:
         try:
-            response = self.supabase.table("manifest").select("key, value").execute()
+            response = self.__execute(self.supabase.table("manifest").select("key, value"))
             if not response.data:
                 return {}
             return {item['key']: item['value'] for item in response.data}
@@ -147,7 +348,7 @@ class DatabaseManager:
             failed_ranges = []
 
             try:
-                total_items = self.supabase.table("metas").select("key", count='exact').execute().count
+                total_items = self.__execute(self.supabase.table("metas").select("key", count='exact')).count
             except Exception as e:
                 log.warning(f"Failed to get exact count for metas, using pagination fallback: {e}")
                 total_items = page_size
@@ -160,10 +361,10 @@ class DatabaseManager:
                 max_retries = 3
                 for attempt in range(max_retries):
                     try:
-                        response = self.supabase.table("metas") \
+                        query = self.supabase.table("metas") \
                             .select("key, value") \
-                            .range(start, end) \
-                            .execute()
+                            .range(start, end)
+                        response = self.__execute(query)
                         result = {item['key']: item['value'] for item in response.data}
                         if not result and total_items == page_size:
                             return None
@@ -198,10 +399,10 @@ class DatabaseManager:
             start = 0
 
             while True:
-                response = self.supabase.table("catalogs") \
+                query = self.supabase.table("catalogs") \
                     .select("key, value") \
-                    .range(start, start + page_size - 1) \
-                    .execute()
+                    .range(start, start + page_size - 1)
+                response = self.__execute(query)
 
                 if not response.data:
                     break
@@ -248,7 +449,7 @@ class DatabaseManager:
                 max_retries = 3
                 for attempt in range(max_retries):
                     try:
-                        self.supabase.table("tmdb_ids").upsert(data).execute()
+                        self.__execute(self.supabase.table("tmdb_ids").upsert(data))
                         break
                     except Exception as e:
                         if attempt == max_retries - 1:
@@ -269,8 +470,8 @@ class DatabaseManager:
         try:
 
             chunk_size = 500
-            # remove duplacates 
-            metas_items = list(OrderedDict.fromkeys(metas.items()))
+            # Keys of a mapping are already unique, the values are dicts and cannot be hashed
+            metas_items = list(metas.items())
 
             for i in range(0, len(metas_items), chunk_size):
                 chunk = dict(metas_items[i:i + chunk_size])
@@ -280,7 +481,7 @@ class DatabaseManager:
                 max_retries = 3
                 for attempt in range(max_retries):
                     try:
-                        self.supabase.table("metas").upsert(data).execute()
+                        self.__execute(self.supabase.table("metas").upsert(data))
                         break
                     except Exception as e:
                         if attempt == max_retries - 1:  # Last attempt
@@ -295,7 +496,6 @@ class DatabaseManager:
                 log.info(f"Processed metas chunk {i//chunk_size + 1}/{(len(metas_items) + chunk_size - 1)//chunk_size}")
 
             self.__db_update_changes("metas", metas)
-            self.__cached_data["metas"] = self.get_metas()
         except Exception as e:
             log.error(f"Failed to update metas: {e}")
 
@@ -303,9 +503,8 @@ class DatabaseManager:
         try:
 
             data = [{"key": key, "value": value} for key, value in manifest.items()]
-            self.supabase.table("manifest").upsert(data).execute()
+            self.__execute(self.supabase.table("manifest").upsert(data))
             self.__db_update_changes("manifest", manifest)
-            self.__cached_data["manifest"] = self.get_manifest()
         except Exception as e:
             log.error(f"Failed to update manifest: {e}")
 
@@ -320,6 +519,8 @@ class DatabaseManager:
                         return obj.isoformat()
                     if isinstance(obj, ImdbInfo):
                         return obj.to_dict()
+                    if isinstance(obj, SnapshotCatalog):
+                        return list(obj)
                     return super().default(obj)
 
             chunk_size = 10
@@ -349,7 +550,7 @@ class DatabaseManager:
                 max_retries = 3
                 for attempt in range(max_retries):
                     try:
-                        self.supabase.table("catalogs").upsert(data).execute()
+                        self.__execute(self.supabase.table("catalogs").upsert(data))
                         break
                     except Exception as e:
                         if attempt == max_retries - 1:  # Last attempt
@@ -364,7 +565,6 @@ class DatabaseManager:
                 log.info(f"Processed catalogs chunk {i//chunk_size + 1}/{(len(catalog_items) + chunk_size - 1)//chunk_size}")
 
             self.__db_update_changes("catalogs", serializable_catalogs)
-            self.__cached_data["catalogs"] = self.get_catalogs()
         except Exception as e:
             log.error(f"Failed to update catalogs: {e}")
 
@@ -406,10 +606,10 @@ class DatabaseManager:
 
     def get_metas_by_keys(self, keys: list[str]) -> dict:
         try:
-            response = self.supabase.table("metas") \
+            query = self.supabase.table("metas") \
                     .select("key, value") \
-                    .in_("key", keys) \
-                    .execute()
+                    .in_("key", keys)
+            response = self.__execute(query)
 
             if not response.data:
                 return {}
@@ -420,14 +620,84 @@ class DatabaseManager:
             log.error(f"Failed to read specific metas: {e}")
             return {}
 
+    @staticmethod
+    def __get_query_labels(query) -> tuple[str, str]:
+        """Table and operation of a PostgREST query, used to label its timings."""
+        path = query.path.strip("/")
+        if path.startswith("rpc/"):
+            return path.removeprefix("rpc/"), "rpc"
+        if query.http_method == "POST":
+            prefer = query.headers.get("prefer") or ""
+            return path, "upsert" if "merge-duplicates" in prefer else "insert"
+        return path, {"GET": "select", "HEAD": "count", "PATCH": "update", "DELETE": "delete"}.get(
+            query.http_method, query.http_method.lower()
+        )
+
+    def __execute(self, query):
+        with SUPABASE_REQUESTS.time(*self.__get_query_labels(query)):
+            return query.execute()
+
+    async def __execute_async(self, query):
+        with SUPABASE_REQUESTS.time(*self.__get_query_labels(query)):
+            return await query.execute()
+
+    async def __get_async_supabase(self) -> AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self.__async_loop is not loop:
+            # Pooled connections, locks and semaphores belong to the loop that created them
+            self.__async_loop = loop
+            self.__async_supabase = None
+            self.__async_lock = asyncio.Lock()
+            self.__async_semaphore = asyncio.Semaphore(self.ASYNC_MAX_CONCURRENCY)
+        async with self.__async_lock:
+            if self.__async_supabase is None:
+                self.__async_supabase = await acreate_client(
+                    env.SUPABASE_URL,
+                    env.SUPABASE_KEY,
+                    options=AsyncClientOptions(postgrest_client_timeout=self.ASYNC_TIMEOUT),
+                )
+        return self.__async_supabase
+
+    async def get_metas_by_keys_async(self, keys: list[str]) -> dict:
+        try:
+            client = await self.__get_async_supabase()
+            async with self.__async_semaphore:
+                query = client.table("metas") \
+                        .select("key, value") \
+                        .in_("key", keys)
+                response = await self.__execute_async(query)
+
+            if not response.data:
+                return {}
+            metas = {item['key']: item['value'] for item in response.data}
+            self.cached_metas.update(metas)
+            return metas
+        except Exception as e:
+            log.error(f"Failed to read specific metas: {e}")
+            return {}
+
+    async def get_recent_changes_async(self, limit: int = 50) -> list:
+        try:
+            client = await self.__get_async_supabase()
+            async with self.__async_semaphore:
+                query = client.table("changes") \
+                    .select("*") \
+                    .order("timestamp", desc=True) \
+                    .limit(limit)
+                response = await self.__execute_async(query)
+            return response.data
+        except Exception as e:
+            log.error(f"Failed to get recent changes: {e}")
+            return []
+
     def get_recent_changes(self, limit: int = 50) -> list:
         """Get the most recent changes."""
         try:
-            response = self.supabase.table("changes") \
+            query = self.supabase.table("changes") \
                 .select("*") \
                 .order("timestamp", desc=True) \
-                .limit(limit) \
-                .execute()
+                .limit(limit)
+            response = self.__execute(query)
             return response.data
         except Exception as e:
             log.error(f"Failed to get recent changes: {e}")
@@ -21,3 +21,13 @@ SUPABASE_KEY: str | None = os.getenv("SUPABASE_KEY") or None
 
 SPONSOR: str = os.getenv("SPONSOR") or ""
 SKIP_DB_UPDATE: bool = os.getenv("SKIP_DB_UPDATE") == "True"
+
+SNAPSHOT_PATH: str = os.getenv("SNAPSHOT_PATH") or "data/snapshot.bin"
+SNAPSHOT_POLL_INTERVAL: int = int(os.getenv("SNAPSHOT_POLL_INTERVAL") or 10)
+LEADER_LOCK_PATH: str = os.getenv("LEADER_LOCK_PATH") or f"{SNAPSHOT_PATH}.lock"
+REFRESH_SCHEDULE_PATH: str = os.getenv("REFRESH_SCHEDULE_PATH") or f"{SNAPSHOT_PATH}.schedule"
+POPULARITY_PATH: str = os.getenv("POPULARITY_PATH") or f"{SNAPSHOT_PATH}.popularity"
+SERVE_ONLY: bool = os.getenv("SERVE_ONLY") == "True"
+META_STORE_MAX_MB: int = int(os.getenv("META_STORE_MAX_MB") or 64)
+PAGE_CACHE_MAX_MB: int = int(os.getenv("PAGE_CACHE_MAX_MB") or 64)
+META_CACHE_MAX_MB: int = int(os.getenv("META_CACHE_MAX_MB") or 32)
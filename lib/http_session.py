@@ -0,0 +1,222 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import AsyncIterator, Callable, Iterator
+
+import httpx
+
+from lib.metrics import AsyncInstrumentedTransport, InstrumentedTransport
+from lib.rate_limiter import RateLimiter
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_SUPPORTED = True
+except ImportError:
+    HTTP2_SUPPORTED = False
+
+# Per client, above the sum of the host caps below over the dozen upstream hosts (32 for TMDB, 16 for each of
+# the other eleven, 208 in all), so requests let through by their host cap never wait for a pool connection
+MAX_CONNECTIONS = 256
+MAX_KEEPALIVE_CONNECTIONS = 50
+KEEPALIVE_EXPIRY = 30
+DEFAULT_TIMEOUT = 5
+HOST_CONCURRENCY = 16
+# Throttled requests are sent again while the host asks to wait no longer than this
+MAX_THROTTLE_RETRIES = 2
+MAX_THROTTLE_WAIT = 30
+# Hosts that take more parallel requests than the default
+HOST_CONCURRENCY_OVERRIDES: dict[str, int] = {
+    "api.themoviedb.org": 32,
+}
+
+
+def get_host_concurrency(host: str) -> int:
+    return HOST_CONCURRENCY_OVERRIDES.get(host, HOST_CONCURRENCY)
+
+
+class HostSlotStream(httpx.SyncByteStream):
+    """Response body that gives its host slot back once the response is closed, not when its headers arrive."""
+
+    def __init__(self, stream: httpx.SyncByteStream, release: Callable[[], None]):
+        self.__stream: httpx.SyncByteStream = stream
+        self.__release: Callable[[], None] | None = release
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.__stream
+
+    def close(self):
+        try:
+            self.__stream.close()
+        finally:
+            release, self.__release = self.__release, None
+            if release is not None:
+                release()
+
+
+class AsyncHostSlotStream(httpx.AsyncByteStream):
+    """Async counterpart of `HostSlotStream`."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self.__stream: httpx.AsyncByteStream = stream
+        self.__release: Callable[[], None] | None = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.__stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.__stream.aclose()
+        finally:
+            release, self.__release = self.__release, None
+            if release is not None:
+                release()
+
+
+class HostLimitedTransport(InstrumentedTransport):
+    """Caps and paces the requests in flight to each host, sending throttled ones again once allowed."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.__lock = threading.Lock()
+        self.__limits: dict[str, threading.BoundedSemaphore] = {}
+
+    def __get_limit(self, host: str) -> threading.BoundedSemaphore:
+        limit = self.__limits.get(host)
+        if limit is None:
+            with self.__lock:
+                limit = self.__limits.setdefault(host, threading.BoundedSemaphore(get_host_concurrency(host)))
+        return limit
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        rate_limiter = RateLimiter.for_host(host)
+        limit = self.__get_limit(host)
+        limit.acquire()
+        try:
+            for attempt in range(MAX_THROTTLE_RETRIES + 1):
+                rate_limiter.acquire()
+                response = super().handle_request(request)
+                throttled = rate_limiter.on_response(response.status_code, response.headers.get("Retry-After"))
+                if not throttled or attempt == MAX_THROTTLE_RETRIES or rate_limiter.paused_for > MAX_THROTTLE_WAIT:
+                    break
+                response.close()
+        except BaseException:
+            limit.release()
+            raise
+        response.stream = HostSlotStream(response.stream, limit.release)
+        return response
+
+
+class AsyncHostLimitedTransport(AsyncInstrumentedTransport):
+    """Async counterpart of `HostLimitedTransport`, its concurrency caps are bound to the loop of its client."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.__limits: dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        limit = self.__limits.get(host)
+        if limit is None:
+            limit = self.__limits.setdefault(host, asyncio.Semaphore(get_host_concurrency(host)))
+        rate_limiter = RateLimiter.for_host(host)
+        await limit.acquire()
+        try:
+            for attempt in range(MAX_THROTTLE_RETRIES + 1):
+                await rate_limiter.acquire_async()
+                response = await super().handle_async_request(request)
+                throttled = rate_limiter.on_response(response.status_code, response.headers.get("Retry-After"))
+                if not throttled or attempt == MAX_THROTTLE_RETRIES or rate_limiter.paused_for > MAX_THROTTLE_WAIT:
+                    break
+                await response.aclose()
+        except BaseException:
+            limit.release()
+            raise
+        response.stream = AsyncHostSlotStream(response.stream, limit.release)
+        return response
+
+
+class HttpSession:
+    """Process-wide pooled HTTP clients shared by every API client, the async ones kept per event loop."""
+
+    __lock = threading.Lock()
+    __pid: int | None = None
+    __client: httpx.Client | None = None
+    __async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+        weakref.WeakKeyDictionary()
+    )
+
+    @staticmethod
+    def __get_limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+
+    @classmethod
+    def __check_pid(cls):
+        # Pooled sockets must not be shared with forked workers
+        pid = os.getpid()
+        if cls.__pid != pid:
+            cls.__pid = pid
+            cls.__client = None
+            cls.__async_clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def get_client(cls) -> httpx.Client:
+        with cls.__lock:
+            cls.__check_pid()
+            if cls.__client is None:
+                cls.__client = httpx.Client(
+                    timeout=DEFAULT_TIMEOUT,
+                    transport=HostLimitedTransport(http2=HTTP2_SUPPORTED, limits=cls.__get_limits()),
+                )
+            return cls.__client
+
+    @classmethod
+    def get_async_client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with cls.__lock:
+            cls.__check_pid()
+            client = cls.__async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    timeout=DEFAULT_TIMEOUT,
+                    transport=AsyncHostLimitedTransport(http2=HTTP2_SUPPORTED, limits=cls.__get_limits()),
+                )
+                cls.__async_clients[loop] = client
+            return client
+
+    @classmethod
+    async def close_async_client(cls):
+        """Closes the async client of the running event loop, for loops that are about to end."""
+        loop = asyncio.get_running_loop()
+        with cls.__lock:
+            client = cls.__async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    @classmethod
+    def get_stats(cls) -> dict[str, dict[str, int]]:
+        """Pooled `active` and `idle` connections by host, and how many of them use `http2`."""
+        clients = [cls.__client, *list(cls.__async_clients.values())]
+        stats: dict[str, dict[str, int]] = {}
+        for client in clients:
+            # httpx keeps its connection pool private, pools it no longer exposes are left out of the stats
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            for connection in list(getattr(pool, "connections", None) or []):
+                try:
+                    host = connection._origin.host.decode()
+                    idle = connection.is_idle()
+                    http2 = "HTTP/2" in connection.info()
+                except (AttributeError, TypeError):
+                    continue
+                host_stats = stats.setdefault(host, {"active": 0, "idle": 0, "http2": 0})
+                host_stats["idle" if idle else "active"] += 1
+                if http2:
+                    host_stats["http2"] += 1
+        return stats
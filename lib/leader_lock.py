@@ -0,0 +1,50 @@
+import os
+
+from lib import log
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class LeaderLock:
+    """Non-blocking exclusive file lock electing one process on the host as leader until it exits."""
+
+    def __init__(self, path: str):
+        self.__path: str = path
+        self.__file = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.__file is not None
+
+    def try_acquire(self) -> bool:
+        if self.__file is not None:
+            return True
+        if fcntl is None:
+            # No advisory locks on this platform, every process runs as its own leader
+            self.__file = True
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.__path)), exist_ok=True)
+        file = open(self.__path, "a+")
+        try:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        file.seek(0)
+        file.truncate()
+        file.write(str(os.getpid()))
+        file.flush()
+        self.__file = file
+        log.info(f"::=>[Leader] Process {os.getpid()} acquired {self.__path}")
+        return True
+
+    def release(self):
+        file = self.__file
+        self.__file = None
+        if file is None or file is True:
+            return
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+        file.close()
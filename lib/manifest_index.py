@@ -0,0 +1,60 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import orjson
+
+from lib.utils import compute_etag
+
+
+class ManifestIndex:
+    """uuid -> catalog lookup and a bounded LRU of configured manifests for one manifest version."""
+
+    def __init__(self, manifest: dict, version: int = 0, max_size: int = 1024):
+        self.__manifest: dict = manifest
+        self.__version: int = version
+        self.__max_size: int = max_size
+        self.__lock = threading.Lock()
+        self.__configured: OrderedDict[tuple[str | None, str], tuple[dict, str]] = OrderedDict()
+        self.__catalogs_by_uuid: dict[str, list[dict]] = {}
+        for catalog in manifest.get("catalogs", []):
+            catalog_id = catalog.get("id", None)
+            if catalog_id is None:
+                continue
+            uuid = hashlib.md5(catalog_id.encode()).hexdigest()[:5]
+            self.__catalogs_by_uuid.setdefault(uuid, []).append(catalog)
+
+    @property
+    def manifest(self) -> dict:
+        return self.__manifest
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    def is_valid_for(self, manifest: dict) -> bool:
+        return self.__manifest is manifest
+
+    def get_catalogs(self, uuids: list[str]) -> list[dict]:
+        catalogs = []
+        for uuid in uuids:
+            catalogs.extend(self.__catalogs_by_uuid.get(uuid, []))
+        return catalogs
+
+    def get_configured(self, configs: str | None, base_url: str) -> tuple[dict, str] | None:
+        key = (configs, base_url)
+        with self.__lock:
+            entry = self.__configured.get(key)
+            if entry is not None:
+                self.__configured.move_to_end(key)
+            return entry
+
+    def put_configured(self, configs: str | None, base_url: str, manifest: dict) -> tuple[dict, str]:
+        key = (configs, base_url)
+        entry = (manifest, compute_etag(orjson.dumps(manifest)))
+        with self.__lock:
+            self.__configured[key] = entry
+            self.__configured.move_to_end(key)
+            while len(self.__configured) > self.__max_size:
+                self.__configured.popitem(last=False)
+        return entry
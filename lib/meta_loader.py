@@ -0,0 +1,87 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from lib import log
+
+
+class MetaLoader:
+    """
+    Dataloader for metas: keys requested by concurrent callers within a short window are deduplicated and
+    fetched with one bulk query, and every caller gets its share of the result.
+    """
+
+    def __init__(
+        self, fetch: Callable[[list[str]], Awaitable[dict]], delay: float = 0.005, max_batch_size: int = 200
+    ):
+        self.__fetch: Callable[[list[str]], Awaitable[dict]] = fetch
+        self.__delay: float = delay
+        self.__max_batch_size: int = max_batch_size
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__pending: dict[str, asyncio.Future] = {}
+        self.__in_flight: dict[str, asyncio.Future] = {}
+        self.__flush_handle: asyncio.TimerHandle | None = None
+        self.__batches: int = 0
+        self.__requested_keys: int = 0
+        self.__fetched_keys: int = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "batches": self.__batches,
+            "requested_keys": self.__requested_keys,
+            "fetched_keys": self.__fetched_keys,
+        }
+
+    async def load_many(self, keys: list[str]) -> dict[str, dict]:
+        loop = asyncio.get_running_loop()
+        if self.__loop is not loop:
+            # Futures are bound to their loop, start over when a new one runs
+            self.__loop = loop
+            self.__pending = {}
+            self.__in_flight = {}
+            self.__flush_handle = None
+
+        futures = {}
+        for key in keys:
+            if key in futures:
+                continue
+            future = self.__pending.get(key) or self.__in_flight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self.__pending[key] = future
+            futures[key] = future
+        self.__requested_keys += len(futures)
+
+        if len(self.__pending) >= self.__max_batch_size:
+            self.__flush()
+        elif len(self.__pending) > 0 and self.__flush_handle is None:
+            self.__flush_handle = loop.call_later(self.__delay, self.__flush)
+
+        # A cancelled caller must not cancel the futures other callers are waiting on
+        results = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return {key: meta for key, meta in zip(futures.keys(), results) if meta is not None}
+
+    def __flush(self):
+        if self.__flush_handle is not None:
+            self.__flush_handle.cancel()
+            self.__flush_handle = None
+        batch = self.__pending
+        self.__pending = {}
+        if len(batch) == 0:
+            return
+        self.__in_flight.update(batch)
+        self.__batches += 1
+        self.__fetched_keys += len(batch)
+        asyncio.ensure_future(self.__run(batch))
+
+    async def __run(self, batch: dict[str, asyncio.Future]):
+        try:
+            metas = await self.__fetch(list(batch.keys()))
+        except Exception as e:
+            log.error(f"::=>[Meta Loader] Failed to fetch {len(batch)} metas: {e}")
+            metas = {}
+        for key, future in batch.items():
+            if self.__in_flight.get(key) is future:
+                del self.__in_flight[key]
+            if not future.done():
+                future.set_result(metas.get(key))
@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import orjson
+
+
+class MetaStore(MutableMapping):
+    """Thread-safe LRU of metas bounded by the serialized size of its entries."""
+
+    def __init__(self, max_bytes: int):
+        self.__max_bytes: int = max_bytes
+        self.__lock = threading.Lock()
+        self.__entries: OrderedDict[str, tuple[dict, int]] = OrderedDict()
+        self.__bytes: int = 0
+        self.__hits: int = 0
+        self.__misses: int = 0
+        self.__evictions: int = 0
+
+    @property
+    def max_bytes(self) -> int:
+        return self.__max_bytes
+
+    @property
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "bytes": self.__bytes,
+                "max_bytes": self.__max_bytes,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+            }
+
+    def __getitem__(self, key: str) -> dict:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                raise KeyError(key)
+            self.__hits += 1
+            self.__entries.move_to_end(key)
+            return entry[0]
+
+    def __contains__(self, key) -> bool:
+        return key in self.__entries
+
+    def __setitem__(self, key: str, value: dict):
+        size = len(orjson.dumps(value))
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__bytes -= previous[1]
+            if size > self.__max_bytes:
+                self.__evictions += 1
+                return
+            self.__entries[key] = (value, size)
+            self.__bytes += size
+            while self.__bytes > self.__max_bytes:
+                _, (_, evicted_size) = self.__entries.popitem(last=False)
+                self.__bytes -= evicted_size
+                self.__evictions += 1
+
+    def __delitem__(self, key: str):
+        with self.__lock:
+            _, size = self.__entries.pop(key)
+            self.__bytes -= size
+
+    def __iter__(self):
+        with self.__lock:
+            keys = list(self.__entries.keys())
+        return iter(keys)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
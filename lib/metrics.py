@@ -0,0 +1,268 @@
+import time
+from bisect import bisect_left
+from typing import Callable
+
+import httpx
+
+# Samples are recorded without taking a lock: a series is a plain list updated in place and new series
+# are added with dict.setdefault, both safe under the GIL. A rare lost increment when two threads hit
+# the same series at once is an accepted trade for keeping the request path free of contention.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name: str = name
+        self.help: str = help
+        self.labels: tuple[str, ...] = labels
+        self._series: dict[tuple, list] = {}
+        _metrics.append(self)
+
+    def _format_labels(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{self.__escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @staticmethod
+    def __escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, series in list(self._series.items()):
+            lines.append(f"{self.name}{self._format_labels(values)} {_format_value(series[0])}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [0])
+        series[0] += amount
+
+    def set(self, value: float, *labels):
+        """Mirrors a total that is already counted elsewhere, such as the hit counters of a cache."""
+        self._series[labels] = [value]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._series[labels] = [value]
+
+    def clear(self):
+        self._series = {}
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets: tuple[float, ...] = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # One count per bucket plus the +Inf bucket, then the sum
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 2))
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels) -> "Timer":
+        return Timer(self, labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        bounds = [_format_value(bucket) for bucket in self.buckets] + ["+Inf"]
+        for values, series in list(self._series.items()):
+            series = list(series)
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                bucket_labels = self._format_labels(values, 'le="' + bound + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = self._format_labels(values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Timer:
+    """Observes the time spent in a `with` block, with a last `outcome` label of `ok` or `error`."""
+
+    __slots__ = ("__histogram", "__labels", "__start")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.__histogram: Histogram = histogram
+        self.__labels: tuple = labels
+        self.__start: float = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        outcome = "ok" if exc_type is None else "error"
+        self.__histogram.observe(time.perf_counter() - self.__start, *self.__labels, outcome)
+        return False
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+_metrics: list[Metric] = []
+_collectors: list[Callable[[], None]] = []
+
+
+def add_collector(collector: Callable[[], None]):
+    """Registers a callback that refreshes gauges from their source right before each scrape."""
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    for collector in _collectors:
+        collector()
+    lines = []
+    for metric in _metrics:
+        if len(metric._series) > 0:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Histogram(
+    "cyberflix_http_request_duration_seconds", "Time spent serving a request", ("route", "method", "status")
+)
+SUPABASE_REQUESTS = Histogram(
+    "cyberflix_supabase_request_duration_seconds", "Time spent in Supabase calls", ("table", "operation", "outcome")
+)
+UPSTREAM_REQUESTS = Histogram(
+    "cyberflix_upstream_request_duration_seconds",
+    "Time until the response headers of upstream API calls",
+    ("host", "outcome"),
+)
+CATALOG_BUILD_SECONDS = Gauge(
+    "cyberflix_catalog_build_duration_seconds", "Duration of the last build of a catalog config", ("catalog",)
+)
+BUILD_SECONDS = Histogram(
+    "cyberflix_build_duration_seconds",
+    "Duration of full catalog builds",
+    ("outcome",),
+    buckets=(60, 300, 600, 1200, 1800, 3600, 7200, 14400),
+)
+
+META_CACHE_LOOKUPS = Counter(
+    "cyberflix_meta_cache_lookups_total", "Lookups of cached metas by where they were found", ("result",)
+)
+META_STORE_BYTES = Gauge("cyberflix_meta_store_bytes", "Serialized size of the metas held in memory", ("kind",))
+META_STORE_ENTRIES = Gauge("cyberflix_meta_store_entries", "Metas held in memory on top of the snapshot")
+META_STORE_EVICTIONS = Counter("cyberflix_meta_store_evictions_total", "Metas evicted from memory")
+META_LOADER_BATCHES = Counter("cyberflix_meta_loader_batches_total", "Bulk meta queries sent to Supabase")
+META_LOADER_KEYS = Counter("cyberflix_meta_loader_keys_total", "Meta keys requested and fetched", ("stage",))
+PAGE_CACHE_ENTRIES = Gauge("cyberflix_page_cache_entries", "Catalog pages rendered ahead of requests")
+PAGE_CACHE_BYTES = Gauge(
+    "cyberflix_page_cache_bytes", "Size of the rendered catalog pages and their compressed copies", ("kind",)
+)
+META_ENDPOINT_CACHE_BYTES = Gauge(
+    "cyberflix_meta_endpoint_cache_bytes", "Serialized size of the metas cached for the meta endpoint", ("kind",)
+)
+SNAPSHOT_VERSION = Gauge("cyberflix_snapshot_version", "Version of the snapshot being served")
+SNAPSHOT_AGE = Gauge("cyberflix_snapshot_age_seconds", "Time since the snapshot being served was written")
+HTTP_POOL_CONNECTIONS = Gauge(
+    "cyberflix_http_pool_connections", "Upstream connections kept in the shared pools", ("host", "state")
+)
+HTTP_POOL_HTTP2_CONNECTIONS = Gauge(
+    "cyberflix_http_pool_http2_connections", "Pooled upstream connections using HTTP/2", ("host",)
+)
+UPSTREAM_RATE_LIMIT = Gauge(
+    "cyberflix_upstream_rate_limit", "Requests per second currently allowed to each upstream host", ("host",)
+)
+UPSTREAM_THROTTLED = Counter(
+    "cyberflix_upstream_throttled_total",
+    "Upstream responses asking to slow down, 429 or 503 with Retry-After",
+    ("host",),
+)
+UPSTREAM_RATE_LIMIT_WAIT = Counter(
+    "cyberflix_upstream_rate_limit_wait_seconds_total",
+    "Time requests waited for the rate limit of their host",
+    ("host",),
+)
+LEADER = Gauge("cyberflix_leader", "Whether this worker holds the update leader lock")
+
+
+def get_outcome(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """HTTP transport that records the latency and outcome of every upstream call by host."""
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            UPSTREAM_REQUESTS.observe(time.perf_counter() - start, request.url.host, "error")
+            raise
+        UPSTREAM_REQUESTS.observe(time.perf_counter() - start, request.url.host, get_outcome(response.status_code))
+        return response
+
+
+class AsyncInstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Async counterpart of `InstrumentedTransport`."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            UPSTREAM_REQUESTS.observe(time.perf_counter() - start, request.url.host, "error")
+            raise
+        UPSTREAM_REQUESTS.observe(time.perf_counter() - start, request.url.host, get_outcome(response.status_code))
+        return response
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request by the endpoint that served it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched endpoint in the scope; labelling by its name keeps the
+            # series count bounded no matter which ids or configs show up in the paths
+            endpoint = scope.get("endpoint")
+            if endpoint is None:
+                route = "unmatched"
+            else:
+                # Mounted apps such as the static files are instances rather than functions
+                route = getattr(endpoint, "__name__", None) or type(endpoint).__name__
+            HTTP_REQUESTS.observe(time.perf_counter() - start, route, scope["method"], status_code)
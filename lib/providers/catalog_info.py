@@ -1,30 +1,139 @@
+import threading
+
 from lib.model.catalog_type import CatalogType
 
 
 class ImdbInfo:
-    def __init__(self, id: str, type: CatalogType, genres=[], year="") -> None:
-        self.id = id
+    """
+    Catalog entry kept compact: `tt` ids are stored as integers, the year as an integer and the genres
+    as a bitmask over a process-wide table of genre names. The public attributes keep their string form.
+    """
+
+    __slots__ = ("__id", "type", "__genre_mask", "__year")
+
+    __genre_lock = threading.Lock()
+    __genre_bits: dict[str, int] = {}
+    __genre_names: list[str] = []
+    __genre_masks: dict[tuple, int] = {(): 0}
+    __genre_tuples: dict[int, tuple[str, ...]] = {0: ()}
+    __years: dict[str | int, int] = {"": 0}
+    __types: dict[str, CatalogType] = {catalog_type.value: catalog_type for catalog_type in CatalogType}
+
+    def __init__(self, id: str, type: CatalogType, genres: list[str] | None = None, year: str | int = "") -> None:
+        self.__id: int | str = self.__encode_id(id)
         self.type = type
-        self.genres = genres
-        self.year = year
+        self.__genre_mask: int = self.__get_genre_mask(genres)
+        self.__year: int = self.__get_year(year)
+
+    @property
+    def id(self) -> str:
+        value = self.__id
+        if isinstance(value, str):
+            return value
+        return f"tt{value >> 4:0{value & 15}d}"
+
+    @property
+    def genres(self) -> tuple[str, ...]:
+        return self.get_genre_names(self.__genre_mask)
 
-    def set_genres(self, genres: list[str]):
-        self.genres = genres
+    @property
+    def genre_mask(self) -> int:
+        return self.__genre_mask
+
+    @property
+    def year(self) -> str:
+        return str(self.__year) if self.__year else ""
+
+    @property
+    def year_number(self) -> int:
+        return self.__year
+
+    def set_genres(self, genres: list[str] | tuple[str, ...] | None):
+        self.__genre_mask = self.__get_genre_mask(genres)
+
+    def set_year(self, year: str | int | None):
+        self.__year = self.__get_year(year)
+
+    @staticmethod
+    def get_genre_names(mask: int) -> tuple[str, ...]:
+        genres = ImdbInfo.__genre_tuples.get(mask)
+        if genres is None:
+            names = ImdbInfo.__genre_names
+            genres = tuple(names[bit] for bit in range(mask.bit_length()) if mask >> bit & 1)
+            ImdbInfo.__genre_tuples[mask] = genres
+        return genres
 
-    def set_year(self, year: str):
-        self.year = year
+    @staticmethod
+    def find_genre_bit(genre: str) -> int | None:
+        """Bit of an already known genre, without registering unknown ones."""
+        return ImdbInfo.__genre_bits.get(genre)
+
+    @staticmethod
+    def get_genre_bit(genre: str) -> int:
+        bit = ImdbInfo.__genre_bits.get(genre)
+        if bit is not None:
+            return bit
+        with ImdbInfo.__genre_lock:
+            bit = ImdbInfo.__genre_bits.get(genre)
+            if bit is None:
+                bit = len(ImdbInfo.__genre_names)
+                ImdbInfo.__genre_names.append(genre)
+                ImdbInfo.__genre_bits[genre] = bit
+            return bit
+
+    @staticmethod
+    def get_year_number(year: str | int | None) -> int:
+        """The year as stored by entries, 0 when it has none."""
+        return ImdbInfo.__get_year(year)
+
+    @staticmethod
+    def __get_genre_mask(genres: list[str] | tuple[str, ...] | None) -> int:
+        # The same few genre combinations repeat across every catalog, so they share one mask object
+        key = tuple(genres) if genres else ()
+        mask = ImdbInfo.__genre_masks.get(key)
+        if mask is None:
+            mask = 0
+            for genre in key:
+                if genre is not None:
+                    mask |= 1 << ImdbInfo.get_genre_bit(genre)
+            mask = ImdbInfo.__genre_masks.setdefault(key, mask)
+        return mask
+
+    @staticmethod
+    def __get_year(year: str | int | None) -> int:
+        year = year or ""
+        value = ImdbInfo.__years.get(year)
+        if value is None:
+            if isinstance(year, int):
+                value = year
+            else:
+                # releaseInfo of series looks like "2019-2022", the first year is the one catalogs filter on
+                prefix = year[:4]
+                value = int(prefix) if prefix.isascii() and prefix.isdigit() else 0
+            # Shares one int object per year across all entries
+            value = ImdbInfo.__years.setdefault(value, value)
+            ImdbInfo.__years[year] = value
+        return value
+
+    @staticmethod
+    def __encode_id(id: str) -> int | str:
+        digits = id[2:]
+        if id[:2] == "tt" and digits.isdigit() and digits.isascii() and len(digits) < 16:
+            return int(digits) << 4 | len(digits)
+        return id
 
     def to_dict(self):
-        return {"id": self.id, "type": self.type.value.lower(), "genres": self.genres, "year": self.year}
+        return {"id": self.id, "type": self.type.value.lower(), "genres": list(self.genres), "year": self.year}
 
     @staticmethod
     def from_dict(data: dict):
         d_id = data.get("id")
         if not d_id:
             raise ValueError("Id is required")
+        c_type = data.get("type")
         return ImdbInfo(
             id=d_id,
-            type=CatalogType(data.get("type")),
+            type=ImdbInfo.__types.get(c_type) or CatalogType(c_type),
             genres=data.get("genres"),
             year=data.get("year") or "",
         )
@@ -38,4 +147,4 @@ class ImdbInfo:
         return self.__repr__()
 
     def __repr__(self) -> str:
-        return f"ImdbInfo(id={self.id}, type={self.type}, genres={self.genres}, year={self.year})"
\ No newline at end of file
+        return f"ImdbInfo(id={self.id}, type={self.type}, genres={list(self.genres)}, year={self.year})"
@@ -3,9 +3,13 @@ from abc import abstractmethod
 from lib import log, utils
 from lib.apis.cinemeta import Cinemeta
 from lib.apis.tmdb import TMDB
+from lib.cinemeta_loader import CinemetaLoader
 from lib.model.catalog_type import CatalogType
 from lib.providers.catalog_info import ImdbInfo
 
+# Ids per Cinemeta batch request
+META_CHUNK_SIZE = 15
+
 
 class CatalogProvider:
     def __init__(self, on_demand: bool = False):
@@ -18,36 +22,42 @@ class CatalogProvider:
     def get_imdb_info(self, schema: str, c_type: CatalogType, **kwargs) -> list[ImdbInfo]:
         raise NotImplementedError
 
-    def get_catalog_metas(self, catalog_info: list[ImdbInfo]) -> dict:
-        results = {}
+    def split_by_type(self, catalog_info: list[ImdbInfo]) -> tuple[list[ImdbInfo], list[ImdbInfo]]:
+        series_infos = []
+        movies_infos = []
+        seen_ids = set()
+        for info in catalog_info:
+            if (info.id, info.type) in seen_ids:
+                continue
+            seen_ids.add((info.id, info.type))
+            if info.type == CatalogType.SERIES:
+                series_infos.append(info)
+            elif info.type == CatalogType.MOVIES:
+                movies_infos.append(info)
+        return series_infos, movies_infos
 
-        series_infos = [info for info in catalog_info if info.type == CatalogType.SERIES]
-        movies_infos = [info for info in catalog_info if info.type == CatalogType.MOVIES]
+    def get_catalog_metas(self, catalog_info: list[ImdbInfo]) -> dict:
+        series_infos, movies_infos = self.split_by_type(catalog_info)
 
-        results.update(self.get_all_metas(infos=series_infos, c_type=CatalogType.SERIES))
+        results = self.get_all_metas(infos=series_infos, c_type=CatalogType.SERIES)
         results.update(self.get_all_metas(infos=movies_infos, c_type=CatalogType.MOVIES))
 
-        metas = []
-        for info in catalog_info:
-            if info.id in results:
-                metas.append(results[info.id])
+        metas = [results[info.id] for info in catalog_info if info.id in results]
         return {"metas": metas}
 
-    async def get_catalog_metas_async(self, catalog_info: list[ImdbInfo]) -> dict:
-        results = {}
-        series_infos = [info for info in catalog_info if info.type == CatalogType.SERIES]
-        movies_infos = [info for info in catalog_info if info.type == CatalogType.MOVIES]
-
-        series_metas = await self.get_all_metas_async(infos=series_infos, c_type=CatalogType.SERIES)
-        movies_metas = await self.get_all_metas_async(infos=movies_infos, c_type=CatalogType.MOVIES)
+    async def get_catalog_metas_async(
+        self, catalog_info: list[ImdbInfo], meta_loader: CinemetaLoader | None = None
+    ) -> dict:
+        series_infos, movies_infos = self.split_by_type(catalog_info)
 
-        results.update(series_metas)
-        results.update(movies_metas)
+        results = await self.get_all_metas_async(
+            infos=series_infos, c_type=CatalogType.SERIES, meta_loader=meta_loader
+        )
+        results.update(
+            await self.get_all_metas_async(infos=movies_infos, c_type=CatalogType.MOVIES, meta_loader=meta_loader)
+        )
 
-        metas = []
-        for info in catalog_info:
-            if info.id in results:
-                metas.append(results[info.id])
+        metas = [results[info.id] for info in catalog_info if info.id in results]
         return {"metas": metas}
 
     def get_all_metas(self, infos: list[ImdbInfo], c_type: CatalogType) -> dict:
@@ -72,14 +82,18 @@ class CatalogProvider:
             return result_metas
 
         results = {}
-        chunks = utils.divide_chunks(infos, 15)
+        chunks = utils.divide_chunks(infos, META_CHUNK_SIZE)
         list_results = utils.parallel_for(__get_metas, chunks, c_type=c_type)
         for result in list_results:
             if isinstance(result, dict):
                 results.update(result)
         return results
 
-    async def get_all_metas_async(self, infos: list[ImdbInfo], c_type: CatalogType) -> dict:
+    async def get_all_metas_async(
+        self, infos: list[ImdbInfo], c_type: CatalogType, meta_loader: CinemetaLoader | None = None
+    ) -> dict:
+        """Metas of the items, fetched through the build-wide `meta_loader` or in chunks without one."""
+
         async def __get_metas(**kwargs) -> dict:
             infos = kwargs.get("item", None)
             c_type = kwargs.get("c_type", None)
@@ -89,7 +103,10 @@ class CatalogProvider:
                 ids_to_download.append(info.id)
             if len(ids_to_download) == 0:
                 return result_metas
-            metas = await self.cinemeta.get_metas_async(ids_to_download, s_type=c_type.value.lower())
+            if meta_loader is None:
+                metas = await self.cinemeta.get_metas_async(ids_to_download, s_type=c_type.value.lower())
+            else:
+                metas = await meta_loader.get_metas(ids_to_download, s_type=c_type.value.lower())
             for meta in metas:
                 if meta is None:
                     continue
@@ -101,12 +118,14 @@ class CatalogProvider:
                 if poster == "":
                     log.info(f"Failed to get poster for {imdb_id}, skipping...")
                     continue
-                meta = self.update_meta(meta)
+                # Metas of the loader are shared with other catalogs
+                meta = self.update_meta(dict(meta))
                 result_metas.update({imdb_id: meta})
             return result_metas
 
         results = {}
-        chunks = utils.divide_chunks(infos, 100)
+        # The loader packs the ids of every catalog into its own batches
+        chunks = [infos] if meta_loader is not None else utils.divide_chunks(infos, META_CHUNK_SIZE)
         tasks = [__get_metas(item=chunk, c_type=c_type) for chunk in chunks]
         list_results = await asyncio.gather(*tasks)
         for result in list_results:
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Requests per second each host starts at and may ramp up to, known limits first
+HOST_RATES: dict[str, tuple[float, float]] = {
+    "api.themoviedb.org": (40, 50),
+    "graphql.anilist.co": (0.5, 1.5),
+    "apis.justwatch.com": (2, 10),
+}
+DEFAULT_RATE: tuple[float, float] = (50, 100)
+MIN_RATE = 0.1
+# Share of the maximum rate regained after each successful response
+RAMP_UP_STEP = 0.01
+THROTTLE_STATUS_CODES = (429, 503)
+MAX_RETRY_AFTER = 300
+
+
+class RateLimiter:
+    """Token bucket for one upstream host, slowed down by throttled responses and ramped back up after."""
+
+    __lock = threading.Lock()
+    __limiters: dict[str, "RateLimiter"] = {}
+
+    def __init__(self, host: str, rate: float, max_rate: float):
+        self.__host: str = host
+        self.__lock = threading.Lock()
+        self.__rate: float = rate
+        self.__max_rate: float = max_rate
+        self.__tokens: float = max(1.0, rate)
+        self.__updated_at: float = time.monotonic()
+        self.__paused_until: float = 0.0
+        self.__throttled: int = 0
+        self.__waited: float = 0.0
+
+    @classmethod
+    def for_host(cls, host: str) -> "RateLimiter":
+        limiter = cls.__limiters.get(host)
+        if limiter is None:
+            with cls.__lock:
+                limiter = cls.__limiters.get(host)
+                if limiter is None:
+                    rate, max_rate = HOST_RATES.get(host, DEFAULT_RATE)
+                    limiter = RateLimiter(host, rate, max_rate)
+                    cls.__limiters[host] = limiter
+        return limiter
+
+    @classmethod
+    def get_stats(cls) -> dict[str, dict]:
+        return {host: limiter.stats for host, limiter in list(cls.__limiters.items())}
+
+    @property
+    def host(self) -> str:
+        return self.__host
+
+    @property
+    def paused_for(self) -> float:
+        """Seconds left before the host accepts requests again."""
+        return max(0.0, self.__paused_until - time.monotonic())
+
+    @property
+    def stats(self) -> dict:
+        return {"rate": round(self.__rate, 3), "throttled": self.__throttled, "waited": round(self.__waited, 3)}
+
+    def reserve(self) -> float:
+        """Takes one token, going into debt when the bucket is empty, and returns the seconds to wait."""
+        with self.__lock:
+            now = time.monotonic()
+            burst = max(1.0, self.__rate)
+            self.__tokens = min(burst, self.__tokens + (now - self.__updated_at) * self.__rate)
+            self.__updated_at = now
+            self.__tokens -= 1
+            wait = max(self.__paused_until - now, -self.__tokens / self.__rate, 0.0)
+            self.__waited += wait
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_response(self, status_code: int, retry_after: str | None = None) -> bool:
+        """Adapts the rate to a response of the host, telling whether it throttled the request."""
+        with self.__lock:
+            if status_code not in THROTTLE_STATUS_CODES or (status_code == 503 and retry_after is None):
+                self.__rate = min(self.__max_rate, self.__rate + self.__max_rate * RAMP_UP_STEP)
+                return False
+            self.__throttled += 1
+            self.__rate = max(MIN_RATE, self.__rate / 2)
+            self.__tokens = min(self.__tokens, 0.0)
+            pause = self.parse_retry_after(retry_after)
+            if pause is None:
+                pause = max(1.0, 1 / self.__rate)
+            pause = min(pause, MAX_RETRY_AFTER)
+            self.__paused_until = max(self.__paused_until, time.monotonic() + pause)
+            return True
+
+    @staticmethod
+    def parse_retry_after(value: str | None) -> float | None:
+        """Seconds asked by a `Retry-After` header, given either as seconds or as an HTTP date."""
+        if not value:
+            return None
+        value = value.strip()
+        # str.isdigit also accepts Unicode digits such as "²" that float() rejects
+        if value.isascii() and value.isdigit():
+            return float(value)
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
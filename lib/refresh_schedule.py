@@ -0,0 +1,85 @@
+import heapq
+import os
+import random
+import time
+from datetime import datetime
+
+import orjson
+
+from lib import log
+
+DAY_SECONDS = 24 * 60 * 60
+# Catalogs are rebuilt up to this share of their lifetime early, so the ones sharing a lifetime spread out
+JITTER = 0.1
+# Catalogs falling due this close to each other are rebuilt together
+DUE_WINDOW = 10 * 60
+# Catalogs that failed to build keep their previous items until this delay passed
+FAILURE_RETRY = 30 * 60
+
+
+class RefreshSchedule:
+    """Next due time of every catalog, `expiration_days` after its last build or right away when unknown."""
+
+    def __init__(self, path: str):
+        self.__path: str = path
+        self.__due_at: dict[str, float] = {}
+        self.__queue: list[tuple[float, str]] = []
+        self.__load()
+
+    def __load(self):
+        try:
+            with open(self.__path, "rb") as file:
+                due_at = orjson.loads(file.read())
+        except FileNotFoundError:
+            return
+        except (OSError, orjson.JSONDecodeError) as e:
+            log.error(f"Failed to read refresh schedule {self.__path}: {e}")
+            return
+        for item_id, value in due_at.items():
+            self.__set(item_id, float(value))
+
+    def __set(self, item_id: str, due_at: float):
+        # Rescheduled catalogs leave their previous entry in the queue, it is dropped once it reaches the top
+        self.__due_at[item_id] = due_at
+        heapq.heappush(self.__queue, (due_at, item_id))
+
+    def seed(self, catalogs: dict):
+        """Schedule catalogs built before the schedule existed at their stored expiration date."""
+        for item_id, value in catalogs.items():
+            if item_id in self.__due_at:
+                continue
+            expiration_date = value.get("expiration_date")
+            if isinstance(expiration_date, str):
+                try:
+                    expiration_date = datetime.fromisoformat(expiration_date)
+                except ValueError:
+                    continue
+            if isinstance(expiration_date, datetime):
+                self.__set(item_id, expiration_date.timestamp())
+
+    def is_due(self, item_id: str, now: float | None = None) -> bool:
+        due_at = self.__due_at.get(item_id)
+        return due_at is None or due_at <= (now or time.time()) + DUE_WINDOW
+
+    def get_next_due(self) -> float | None:
+        """Timestamp the next catalog falls due at, None when nothing is scheduled."""
+        while self.__queue:
+            due_at, item_id = self.__queue[0]
+            if self.__due_at.get(item_id) == due_at:
+                return due_at
+            heapq.heappop(self.__queue)
+        return None
+
+    def mark_built(self, item_id: str, expiration_days: float, now: float | None = None):
+        lifetime = expiration_days * DAY_SECONDS
+        self.__set(item_id, (now or time.time()) + lifetime * (1 - JITTER * random.random()))
+
+    def mark_failed(self, item_id: str, now: float | None = None):
+        self.__set(item_id, (now or time.time()) + FAILURE_RETRY)
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.__path)), exist_ok=True)
+        tmp_path = f"{self.__path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(orjson.dumps(self.__due_at))
+        os.replace(tmp_path, self.__path)
@@ -0,0 +1,317 @@
+"""Compact binary snapshot of the served data, shared between workers through mmap."""
+
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping, Sequence
+from datetime import datetime
+
+import numpy as np
+import orjson
+
+from lib import env, log
+from lib.meta_store import MetaStore
+from lib.model.catalog_type import CatalogType
+from lib.providers.catalog_info import ImdbInfo
+
+# Magic, header length, orjson header (manifest, catalog columns, meta record table), then the data section.
+# Catalogs are stored as columns and metas as serialized blobs behind a sorted fixed-width key table.
+MAGIC = b"CYBSNAP1"
+HEADER_LENGTH = struct.Struct("<Q")
+META_RECORD = struct.Struct("<16sQI")
+META_KEY_SIZE = 16
+CATALOG_TYPES = list(CatalogType)
+
+
+def write_snapshot(path: str, manifest: dict, catalogs: dict, metas: MutableMapping) -> int:
+    """Write catalogs and metas to a snapshot atomically replacing `path`, returning its version."""
+    version = time.time_ns()
+    data = bytearray()
+
+    def append(buffer: bytes) -> list[int]:
+        offset = len(data)
+        data.extend(buffer)
+        return [offset, len(buffer)]
+
+    genre_names: dict[str, int] = {}
+    year_names: dict[str, int] = {"": 0}
+    header_catalogs = {}
+    for key, value in catalogs.items():
+        items: list[ImdbInfo] = value.get("data") or []
+        genres = array("Q")
+        years = array("H")
+        for item in items:
+            mask = 0
+            for genre in item.genres or []:
+                if genre is None:
+                    continue
+                mask |= 1 << genre_names.setdefault(genre, len(genre_names))
+            genres.append(mask)
+            years.append(year_names.setdefault(item.year or "", len(year_names)))
+        expiration_date = value.get("expiration_date")
+        if isinstance(expiration_date, datetime):
+            expiration_date = expiration_date.isoformat()
+        header_catalogs[key] = {
+            "expiration_date": expiration_date,
+            "count": len(items),
+            "ids": append("\n".join(item.id for item in items).encode()),
+            "types": append(bytes(CATALOG_TYPES.index(item.type) for item in items)),
+            "genres": append(genres.tobytes()),
+            "years": append(years.tobytes()),
+        }
+    if len(genre_names) > 64:
+        raise ValueError("Snapshot supports at most 64 distinct genres")
+
+    records = []
+    for key in metas.keys():
+        encoded_key = key.encode()
+        if len(encoded_key) > META_KEY_SIZE:
+            log.warning(f"::=>[Snapshot] Skipping meta with oversized key {key}")
+            continue
+        blob = metas.get_raw(key) if isinstance(metas, SnapshotMetas) else None
+        if blob is None:
+            blob = orjson.dumps(metas[key])
+        offset, length = append(blob)
+        records.append((encoded_key, offset, length))
+    records.sort(key=lambda record: record[0].ljust(META_KEY_SIZE, b"\0"))
+    records_offset = len(data)
+    for encoded_key, offset, length in records:
+        data.extend(META_RECORD.pack(encoded_key, offset, length))
+
+    header = orjson.dumps({
+        "version": version,
+        "created_at": datetime.now().isoformat(),
+        "manifest": manifest,
+        "genres": list(genre_names.keys()),
+        "years": list(year_names.keys()),
+        "catalogs": header_catalogs,
+        "metas": {"records": records_offset, "count": len(records)},
+    })
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(HEADER_LENGTH.pack(len(header)))
+        file.write(header)
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    return version
+
+
+class Snapshot:
+    """Read-only view of a snapshot file, memory-mapped so every worker on the host shares its pages."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.__mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        header_start = len(MAGIC) + HEADER_LENGTH.size
+        (header_length,) = HEADER_LENGTH.unpack_from(self.__mmap, len(MAGIC))
+        header = orjson.loads(self.__mmap[header_start : header_start + header_length])
+        self.__data_start: int = header_start + header_length
+        self.__buffer = memoryview(self.__mmap)
+        self.__file_id: tuple[int, int] = (stat.st_ino, stat.st_mtime_ns)
+        self.__version: int = header["version"]
+        self.__created_at: str = header["created_at"]
+        self.__manifest: dict = header["manifest"]
+        self.__genres: list[str] = header["genres"]
+        self.__years: list[str] = header["years"]
+        self.__catalogs: dict = header["catalogs"]
+        self.__records_start: int = self.__data_start + header["metas"]["records"]
+        self.__meta_count: int = header["metas"]["count"]
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def created_at(self) -> str:
+        return self.__created_at
+
+    @property
+    def file_id(self) -> tuple[int, int]:
+        return self.__file_id
+
+    @property
+    def manifest(self) -> dict:
+        return self.__manifest
+
+    @property
+    def meta_count(self) -> int:
+        return self.__meta_count
+
+    def __section(self, span: list[int]) -> memoryview:
+        start = self.__data_start + span[0]
+        return self.__buffer[start : start + span[1]]
+
+    def get_catalogs(self) -> OrderedDict:
+        catalogs = OrderedDict()
+        # Snapshot genre bits are numbered per file, entries use the process-wide numbering of ImdbInfo
+        genre_bits = [ImdbInfo.get_genre_bit(name) for name in self.__genres]
+        year_numbers = np.array([ImdbInfo.get_year_number(name) for name in self.__years], dtype=np.int32)
+        for key, value in self.__catalogs.items():
+            ids = bytes(self.__section(value["ids"])).decode().split("\n") if value["count"] > 0 else []
+            masks, inverse = np.unique(
+                np.frombuffer(self.__section(value["genres"]), dtype=np.uint64), return_inverse=True
+            )
+            masks = [
+                sum(1 << genre_bits[bit] for bit in range(mask.bit_length()) if mask >> bit & 1)
+                for mask in masks.tolist()
+            ]
+            # More than 64 distinct genres no longer fit a machine word, fall back to Python ints
+            dtype = np.uint64 if max(masks, default=0).bit_length() <= 64 else object
+            genre_masks = np.array(masks, dtype=dtype)[inverse.reshape(-1)]
+            years = year_numbers[np.frombuffer(self.__section(value["years"]), dtype=np.uint16)]
+            data = SnapshotCatalog(ids, self.__section(value["types"]), genre_masks, years)
+            catalogs[key] = {"expiration_date": value["expiration_date"], "data": data}
+        return catalogs
+
+    def __find_record(self, key: str) -> tuple[int, int] | None:
+        encoded_key = key.encode()
+        if len(encoded_key) > META_KEY_SIZE:
+            return None
+        encoded_key = encoded_key.ljust(META_KEY_SIZE, b"\0")
+        low, high = 0, self.__meta_count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, offset, length = META_RECORD.unpack_from(
+                self.__mmap, self.__records_start + middle * META_RECORD.size
+            )
+            if record_key < encoded_key:
+                low = middle + 1
+            elif record_key > encoded_key:
+                high = middle
+            else:
+                return offset, length
+        return None
+
+    def get_meta_raw(self, key: str) -> memoryview | None:
+        record = self.__find_record(key)
+        if record is None:
+            return None
+        return self.__section(list(record))
+
+    def iter_meta_keys(self):
+        for idx in range(self.__meta_count):
+            record_key, _, _ = META_RECORD.unpack_from(self.__mmap, self.__records_start + idx * META_RECORD.size)
+            yield record_key.rstrip(b"\0").decode()
+
+
+class SnapshotCatalog(Sequence):
+    """Items of one snapshot catalog, read from its columns and turned into ImdbInfo on access."""
+
+    def __init__(self, ids: list[str], types: memoryview, genre_masks: np.ndarray, years: np.ndarray):
+        self.__ids: list[str] = ids
+        self.__types: memoryview = types
+        self.__genre_masks: np.ndarray = genre_masks
+        self.__years: np.ndarray = years
+
+    # Columns a CatalogIndex filters on without decoding any item
+    @property
+    def genre_masks(self) -> np.ndarray:
+        return self.__genre_masks
+
+    @property
+    def years(self) -> np.ndarray:
+        return self.__years
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self.__ids)))]
+        imdb_id = self.__ids[index]
+        return ImdbInfo(
+            id=imdb_id,
+            type=CATALOG_TYPES[self.__types[index]],
+            genres=ImdbInfo.get_genre_names(int(self.__genre_masks[index])),
+            year=int(self.__years[index]),
+        )
+
+
+class SnapshotMetas(MutableMapping):
+    """Metas backed by a snapshot, with writes kept in a per-process overlay until the next snapshot."""
+
+    def __init__(self, snapshot: Snapshot | None = None, overlay: MutableMapping | None = None):
+        self.__snapshot: Snapshot | None = snapshot
+        self.__overlay: MutableMapping = (
+            overlay if overlay is not None else MetaStore(env.META_STORE_MAX_MB * 1024 * 1024)
+        )
+        self.__snapshot_hits: int = 0
+        self.__misses: int = 0
+
+    @property
+    def overlay(self) -> MutableMapping:
+        return self.__overlay
+
+    @property
+    def stats(self) -> dict:
+        stats = {"snapshot_hits": self.__snapshot_hits, "misses": self.__misses}
+        if isinstance(self.__overlay, MetaStore):
+            stats.update({f"overlay_{key}": value for key, value in self.__overlay.stats.items()})
+        return stats
+
+    def with_overlay(self, metas: dict) -> "SnapshotMetas":
+        """A new mapping over the same snapshot with `metas` layered on top, leaving this one untouched."""
+        # Unbounded, so the overlay can be written out in full as the next snapshot
+        return SnapshotMetas(self.__snapshot, {**self.__overlay, **metas})
+
+    def bounded(self) -> "SnapshotMetas":
+        """This mapping with its overlay moved into a size-bounded store."""
+        if isinstance(self.__overlay, MetaStore):
+            return self
+        overlay = MetaStore(env.META_STORE_MAX_MB * 1024 * 1024)
+        overlay.update(self.__overlay)
+        return SnapshotMetas(self.__snapshot, overlay)
+
+    def get_raw(self, key: str) -> bytes | memoryview | None:
+        if key in self.__overlay:
+            return None
+        if self.__snapshot is None:
+            return None
+        return self.__snapshot.get_meta_raw(key)
+
+    def __getitem__(self, key: str) -> dict:
+        meta = self.__overlay.get(key)
+        if meta is not None:
+            return meta
+        raw = self.get_raw(key)
+        if raw is None:
+            self.__misses += 1
+            raise KeyError(key)
+        self.__snapshot_hits += 1
+        # Every read decodes a new dict, hot pages are served from the catalog page cache instead
+        return orjson.loads(raw)
+
+    def __contains__(self, key) -> bool:
+        if key in self.__overlay:
+            return True
+        return self.__snapshot is not None and self.__snapshot.get_meta_raw(key) is not None
+
+    def __setitem__(self, key: str, value: dict):
+        self.__overlay[key] = value
+
+    def __delitem__(self, key: str):
+        del self.__overlay[key]
+
+    def __iter__(self):
+        yield from self.__overlay
+        if self.__snapshot is not None:
+            for key in self.__snapshot.iter_meta_keys():
+                if key not in self.__overlay:
+                    yield key
+
+    def __len__(self) -> int:
+        if self.__snapshot is None:
+            return len(self.__overlay)
+        overlay_only = sum(1 for key in self.__overlay if self.__snapshot.get_meta_raw(key) is None)
+        return self.__snapshot.meta_count + overlay_only
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+import orjson
+
+from lib import log
+
+
+class TTLCache:
+    """In-process async cache with TTL, stale-while-revalidate and single-flight upstream fetches."""
+
+    def __init__(
+        self,
+        ttl: int = 60 * 60 * 6,
+        stale_ttl: int = 60 * 60 * 24 * 7,
+        max_size: int = 10000,
+        negative_ttl: int = 30,
+        max_bytes: int | None = None,
+    ):
+        self.__ttl: int = ttl
+        self.__stale_ttl: int = stale_ttl
+        self.__max_size: int = max_size
+        # Keys whose fetch raised or returned None are not fetched again for this long
+        self.__negative_ttl: int = negative_ttl
+        # Optional bound on the serialized size of the entries, on top of their count
+        self.__max_bytes: int | None = max_bytes
+        self.__bytes: int = 0
+        self.__entries: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+        self.__failures: OrderedDict[str, float] = OrderedDict()
+        self.__inflight: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self.__bytes
+
+    def peek(self, key: str) -> Any:
+        """The value cached for `key` whatever its age, without fetching it."""
+        entry = self.__entries.get(key)
+        return entry[1] if entry is not None else None
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self.__entries.get(key)
+        failed = self.__has_failed_recently(key)
+        if entry is not None:
+            fetched_at, value, _ = entry
+            self.__entries.move_to_end(key)
+            age = time.monotonic() - fetched_at
+            if age < self.__ttl or failed:
+                return value
+            # Stale entries are served while one background refresh runs
+            if age < self.__ttl + self.__stale_ttl:
+                self.__refresh(key, fetch)
+                return value
+        elif failed:
+            return None
+
+        value = await asyncio.shield(self.__refresh(key, fetch))
+        # A failed refresh keeps serving the last known value
+        if value is None and entry is not None:
+            return entry[1]
+        return value
+
+    def __refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self.__inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.__fetch(key, fetch))
+            self.__inflight[key] = task
+        return task
+
+    async def __fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            try:
+                value = await fetch()
+            except Exception as e:
+                # Background refreshes have no caller to raise to, misses are answered like an empty fetch
+                log.error(f"::=>[Cache] Fetch failed: {e}")
+                value = None
+            if value is None:
+                self.__mark_failed(key)
+            else:
+                self.__failures.pop(key, None)
+                self.__store(key, value)
+            return value
+        finally:
+            self.__inflight.pop(key, None)
+
+    def __has_failed_recently(self, key: str) -> bool:
+        failed_at = self.__failures.get(key)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at < self.__negative_ttl:
+            return True
+        del self.__failures[key]
+        return False
+
+    def __mark_failed(self, key: str):
+        self.__failures[key] = time.monotonic()
+        self.__failures.move_to_end(key)
+        while len(self.__failures) > self.__max_size:
+            self.__failures.popitem(last=False)
+
+    def __store(self, key: str, value: Any):
+        size = len(orjson.dumps(value)) if self.__max_bytes is not None else 0
+        previous = self.__entries.pop(key, None)
+        if previous is not None:
+            self.__bytes -= previous[2]
+        if self.__max_bytes is not None and size > self.__max_bytes:
+            return
+        self.__entries[key] = (time.monotonic(), value, size)
+        self.__bytes += size
+        while len(self.__entries) > self.__max_size or (
+            self.__max_bytes is not None and self.__bytes > self.__max_bytes
+        ):
+            _, (_, _, evicted_size) = self.__entries.popitem(last=False)
+            self.__bytes -= evicted_size
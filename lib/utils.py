@@ -1,4 +1,5 @@
 import concurrent.futures
+import hashlib
 import traceback
 import logging
 import os
@@ -108,3 +109,19 @@ def parallel_for(function: callable, items: list[any], max_workers: int|None = N
 
     log.info("[green]All processing completed!")
     return results
+
+
+def index_by_id(items: list[dict], key: str = "id") -> dict[str, dict]:
+    """Index a list of dicts by one of their fields, keeping the first item seen for each id."""
+    indexed = {}
+    for item in items:
+        item_id = item.get(key)
+        if item_id is None or item_id in indexed:
+            continue
+        indexed[item_id] = item
+    return indexed
+
+
+def compute_etag(body: bytes) -> str:
+    """Weak ETag of an uncompressed body, weak as it is served under several content encodings."""
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
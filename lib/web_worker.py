@@ -1,31 +1,68 @@
-import hashlib
+import asyncio
 import sys
 import threading
 import time
-from copy import deepcopy
-from datetime import datetime, timedelta
+from datetime import datetime
+
+import orjson
 
-from builder import Builder
 from lib.database_manager import DatabaseManager
-from lib import env, log
+from lib import env, log, metrics, utils
+from lib.apis.cinemeta import Cinemeta
 from lib.apis.rpdb import RPDB
 from lib.apis.trakt import Trakt
+from lib.catalog_index import CatalogIndex
+from lib.catalog_page_cache import PAGE_SIZE, CachedPage, CatalogPageCache, PageView
+from lib.catalog_popularity import CatalogPopularity
+from lib.http_session import HttpSession
+from lib.leader_lock import LeaderLock
+from lib.manifest_index import ManifestIndex
+from lib.meta_loader import MetaLoader
 from lib.model.catalog_type import CatalogType
 from lib.model.catalog_web import CatalogWeb
 from lib.providers.catalog_info import ImdbInfo
-from lib.providers.catalog_provider import CatalogProvider
+from lib.rate_limiter import RateLimiter
+from lib.refresh_schedule import RefreshSchedule
+from lib.ttl_cache import TTLCache
 
 db_manager = DatabaseManager.instance()
 
+PREWARM_CATALOGS = 20
+PREWARM_PAGES = 2
+# Pages rendered ahead for every catalog and genre after a swap, later ones are rendered on first request
+WARM_PAGES = 1
+# Seconds between two merges of the request counts of this worker into the shared ones
+POPULARITY_SYNC_INTERVAL = 60
+# Catalogs extended with the Trakt recommendations of the user
+TRAKT_CATALOG_TYPES = {"recommendations.movie": CatalogType.MOVIES, "recommendations.series": CatalogType.SERIES}
+# Bounds of the wait between two checks for due catalogs
+MIN_UPDATE_INTERVAL = 60
+MAX_UPDATE_INTERVAL = 60 * 60
+
 class WebWorker:
     def __init__(self) -> None:
         log.info(f"::=> Initializing {self.__class__.__name__}...")
         self.__rpdb_api = RPDB()
-        self.__provider = CatalogProvider()
-        self.__builder: Builder = Builder()
+        self.__cinemeta = Cinemeta()
+        # Builder, providers and the tmdb id mapping are only loaded once a build or a Trakt request needs them
+        self.__builder = None
+        self.__trakt_provider = None
 
         self.__last_update: datetime = datetime.now()
-
+        self.__manifest_name: str = "Unknown"
+        self.__manifest_version: str = "Unknown"
+        self.__page_cache: CatalogPageCache = CatalogPageCache()
+        self.__genre_options: dict[str, set[str]] = {}
+        self.__manifest_index: ManifestIndex = ManifestIndex(db_manager.cached_manifest)
+        self.__web_config: tuple[ManifestIndex, dict, str] | None = None
+        self.__meta_cache: TTLCache = TTLCache(max_bytes=env.META_CACHE_MAX_MB * 1024 * 1024)
+        self.__trakt_cache: TTLCache = TTLCache(ttl=60 * 30, stale_ttl=60 * 60 * 6, max_size=1000)
+        self.__meta_loader: MetaLoader = MetaLoader(db_manager.get_metas_by_keys_async)
+        self.__popularity: CatalogPopularity = CatalogPopularity(env.POPULARITY_PATH)
+        self.__prewarm_lock = threading.Lock()
+        self.__warm_generation: int = 0
+
+        self.__leader_lock: LeaderLock = LeaderLock(env.LEADER_LOCK_PATH)
         self.__update_interval = self.get_update_interval()
         self.__background_threading_0 = threading.Thread(
             name="Catalog Service", target=self.__background_catalog_updater
@@ -35,16 +72,31 @@ class WebWorker:
             log.info("::=>[Catalogs] No catalogs found in local cache, fetching...")
             self.__update_interval = 0
         else:
-            self.__manifest_name = db_manager.cached_manifest.get("name", "Unknown")
-            self.__manifest_version = db_manager.cached_manifest.get("version", "Unknown")
-            log.info(f"::=>[Manifest Name] {self.__manifest_name}")
-            log.info(f"::=>[Manifest Version] {self.__manifest_version}")
+            self.__load_manifest_info()
             for key, value in db_manager.cached_catalogs.items():
                 data = value.get("data") or []
                 log.info(f"::=>[Catalog] {key} - {len(data)} items")
-
+            self.__load_genre_options()
+
+        db_manager.add_snapshot_listener(self.__on_snapshot_swap)
+        metrics.add_collector(self.__collect_metrics)
+        threading.Thread(name="Popularity Sync", target=self.__sync_popularity, daemon=True).start()
+        # Requests are served from the snapshot while the page cache warms up behind them
+        self.__start_warm()
+        if env.SERVE_ONLY:
+            # Builds run in another process, this one only follows the published snapshots
+            log.info("::=>[Update Service] Serve-only mode, updates come from the snapshot")
+            return
         self.__background_threading_0.start()
 
+    @property
+    def is_leader(self) -> bool:
+        return self.__leader_lock.is_leader
+
+    @property
+    def meta_loader_stats(self) -> dict:
+        return self.__meta_loader.stats
+
     @property
     def manifest_name(self):
         return self.__manifest_name
@@ -54,16 +106,15 @@ class WebWorker:
         return self.__manifest_version
 
     def get_update_interval(self) -> int:
-        # For testing: return 5 minutes (300 seconds) instead of waiting until 3 AM
-        return 300
-
-        # Original code (commented out for testing)
-        # current_time = datetime.now()
-        # tar_time = current_time + timedelta(days=1)
-        # tar_time = tar_time.replace(hour=3, minute=0, second=0, microsecond=0)
-        # log.info(f"::=>[Update Schedule] next update will be at {tar_time.date()} {tar_time.time()}")
-        # diff_time = tar_time - current_time
-        # return round(diff_time.total_seconds())
+        """Seconds until the next catalog falls due, checked at least hourly for new configs."""
+        schedule = RefreshSchedule(env.REFRESH_SCHEDULE_PATH)
+        schedule.seed(db_manager.cached_catalogs)
+        next_due = schedule.get_next_due()
+        if next_due is None:
+            return MIN_UPDATE_INTERVAL
+        interval = round(min(max(next_due - time.time(), MIN_UPDATE_INTERVAL), MAX_UPDATE_INTERVAL))
+        log.info(f"::=>[Update Schedule] next update check in {interval} seconds")
+        return interval
 
     def add_node(self, tree: CatalogWeb, path, node):
         if len(path) == 1:
@@ -95,8 +146,15 @@ class WebWorker:
         web_catalogs = [nested_catalog.to_dict() for nested_catalog in nested_catalogs]
         return web_catalogs
 
-    def get_web_config(self) -> dict:
-        return db_manager.get_web_config(self.get_web_catalogs())
+    def get_web_config(self) -> tuple[dict, str]:
+        """Return the web config and its ETag, rebuilt only when the manifest changes."""
+        manifest_index = self.__get_manifest_index()
+        web_config = self.__web_config
+        if web_config is None or web_config[0] is not manifest_index:
+            config = db_manager.get_web_config(self.get_web_catalogs())
+            web_config = (manifest_index, config, utils.compute_etag(orjson.dumps(config)))
+            self.__web_config = web_config
+        return web_config[1], web_config[2]
 
     def convert_config(self, configs: str) -> dict:
         result = {}
@@ -115,13 +173,30 @@ class WebWorker:
         manifest.update({"catalogs": []})
         return manifest
 
-    def get_configured_manifest(self, base_url: str, configs: str | None) -> dict:
-        config_manifest = deepcopy(db_manager.cached_manifest)
+    def __get_manifest_index(self) -> ManifestIndex:
+        manifest = db_manager.cached_manifest
+        manifest_index = self.__manifest_index
+        if not manifest_index.is_valid_for(manifest):
+            manifest_index = ManifestIndex(manifest, version=manifest_index.version + 1)
+            self.__manifest_index = manifest_index
+        return manifest_index
+
+    def get_configured_manifest(self, base_url: str, configs: str | None) -> tuple[dict, str]:
+        """Return the configured manifest and its ETag. Manifests are shared and must not be mutated by callers."""
+        manifest_index = self.__get_manifest_index()
+        entry = manifest_index.get_configured(configs, base_url)
+        if entry is None:
+            config_manifest = self.__build_configured_manifest(manifest_index, base_url, configs)
+            entry = manifest_index.put_configured(configs, base_url, config_manifest)
+        return entry
+
+    def __build_configured_manifest(self, manifest_index: ManifestIndex, base_url: str, configs: str | None) -> dict:
+        config_manifest = dict(manifest_index.manifest)
         config_manifest.update({"name": env.APP_NAME})
         config_manifest.update({"logo": f"{base_url}logo.png"})
         config_manifest.update({"background": f"{base_url}background.png"})
         config_manifest.update({"version": self.manifest_version})
-        config_manifest.update({"last_update": str(datetime.now())})
+        config_manifest.update({"last_update": str(self.last_update)})
 
         if configs is None:
             return self.remove_manifest_catalogs(config_manifest)
@@ -135,19 +210,8 @@ class WebWorker:
         if len(parsed_config) == 0:
             return self.remove_manifest_catalogs(config_manifest)
 
-        tmp_catalogs = config_manifest.get("catalogs", [])
-        new_catalogs = []
-        for value in parsed_config:
-            for catalog in tmp_catalogs:
-                catalog_id = catalog.get("id", None)
-                if catalog_id is None:
-                    continue
-                md5 = hashlib.md5(catalog_id.encode()).hexdigest()[:5]
-                if md5 == value:
-                    new_catalogs.append(catalog)
-
-            config_manifest.update({"behaviorHints": {"configurable": True, "configurationRequired": False}})
-        config_manifest.update({"catalogs": new_catalogs})
+        config_manifest.update({"behaviorHints": {"configurable": True, "configurationRequired": False}})
+        config_manifest.update({"catalogs": manifest_index.get_catalogs(parsed_config)})
         return config_manifest
 
     def get_trakt_auth_url(self) -> str:
@@ -156,33 +220,93 @@ class WebWorker:
     def get_trakt_access_token(self, code: str) -> str | None:
         return Trakt().get_access_token(code)
 
-    def __get_trakt_recommendations(self, id: str, access_token: str) -> list:
-        trakt_metas = []
-        if id == "recommendations.movie":
-            trakt_metas = self.__builder.get_catalog(
-                provider_id="trakt",
-                schema=f"request_type=recommendations&access_token={access_token}",
-                c_type=CatalogType.MOVIES,
-            )
-        elif id == "recommendations.series":
-            trakt_metas = self.__builder.get_catalog(
-                provider_id="trakt",
-                schema=f"request_type=recommendations&access_token={access_token}",
-                c_type=CatalogType.SERIES,
-            )
-        return trakt_metas
+    def __get_trakt_recommendations(self, id: str, access_token: str) -> list | None:
+        c_type = TRAKT_CATALOG_TYPES[id]
+        trakt_metas = self.__get_trakt_provider().get_imdb_info(
+            schema=f"request_type=recommendations&access_token={access_token}", c_type=c_type
+        )
+        # Failed Trakt calls come back empty, None lets the cache back off instead of keeping no recommendations
+        return trakt_metas or None
 
-    def get_meta(self, id: str, s_type: str, config: str | None) -> dict:
+    def __get_trakt_provider(self):
+        if self.__trakt_provider is None:
+            from lib.providers.trakt_provider import TraktProvider
+
+            self.__trakt_provider = TraktProvider()
+        return self.__trakt_provider
+
+    def __get_builder(self):
+        if self.__builder is None:
+            from builder import Builder
+
+            self.__builder = Builder()
+        return self.__builder
+
+    async def get_meta(self, id: str, s_type: str, config: str | None) -> tuple[dict, str | None]:
         imdb_id = id.replace("cyberflix:", "")
-        original_meta = self.__provider.cinemeta.get_meta(id=imdb_id, s_type=s_type) or {}
-        meta = original_meta.get("meta") or {}
-        return {"meta": meta}
+        entry = await self.__meta_cache.get(f"{s_type}:{imdb_id}", lambda: self.__fetch_meta(imdb_id, s_type))
+        if entry is None:
+            return {"meta": {}}, None
+        return entry
+
+    async def __fetch_meta(self, imdb_id: str, s_type: str) -> tuple[dict, str] | None:
+        original_meta = await self.__cinemeta.get_meta_async(id=imdb_id, s_type=s_type)
+        if original_meta is None:
+            return None
+        meta = {"meta": original_meta.get("meta") or {}}
+        return meta, utils.compute_etag(orjson.dumps(meta))
+
+    async def get_catalog_page(self, id: str, extras: str | None, config: str | None) -> PageView | None:
+        """Serve a catalog page from the page cache, or None when it has to be built per request."""
+        rpdb_key = None
+        lang_key = "en"
+        if config is not None:
+            converted_configs = self.convert_config(config)
+            if converted_configs.get("trakt") is not None:
+                return None
+            rpdb_key = converted_configs.get("rpgb", None)
+            lang_key = converted_configs.get("lang", None) or "en"
+
+        if id not in db_manager.cached_catalogs:
+            return None
+
+        parsed_extras = self.__extras_parser(extras)
+        genre = parsed_extras.get("genre", None)
+        skip = parsed_extras.get("skip", 0)
+        self.__count_catalog_request(id, genre)
+        if skip % PAGE_SIZE != 0:
+            return None
+
+        page_cache = self.__page_cache
+        page = page_cache.get(id, genre, skip)
+        if page is None:
+            catalog_ids = db_manager.cached_catalogs.get(id, {}).get("data") or []
+            page_items = self.__filter_meta(id, catalog_ids, genre, skip)
+            metas = await self.__get_page_metas(page_items)
+            # Only complete pages of filters the manifest offers are kept, anything else is served uncached
+            complete = len(metas) == len(page_items) and (skip == 0 or len(page_items) > 0)
+            if complete and self.__is_known_filter(id, genre):
+                page = page_cache.put(id, genre, skip, metas)
+            else:
+                page = CachedPage(metas)
+
+        return await self.__get_page_view(page, rpdb_key, lang_key)
+
+    async def __get_page_view(self, page: CachedPage, rpdb_key: str | None, lang_key: str) -> PageView:
+        if rpdb_key is None or not await self.__rpdb_api.has_requests_left(rpdb_key, page.size):
+            return PageView(page)
+        return PageView(
+            page,
+            poster_for=lambda imdb_id: self.__rpdb_api.get_poster(imdb_id=imdb_id, api_key=rpdb_key, lang=lang_key),
+            variant=f"{rpdb_key}:{lang_key}",
+            on_render=lambda: self.__rpdb_api.use_requests(rpdb_key, page.size),
+        )
 
-    async def get_configured_catalog(self, id: str, extras: str | None, config: str | None) -> dict:
+    async def get_configured_catalog(self, id: str, extras: str | None, config: str | None) -> PageView:
+        """Build a catalog page per request, for the configs the page cache does not serve."""
         catalog = db_manager.cached_catalogs.get(id) or {}
         catalog_ids = catalog.get("data") or []
 
-
         parsed_extras = self.__extras_parser(extras)
         genre = parsed_extras.get("genre", None)
         skip = parsed_extras.get("skip", 0)
@@ -196,76 +320,238 @@ class WebWorker:
                 trakt_key = converted_configs.get("trakt", None)
                 lang_key = converted_configs.get("lang", None)
 
-        if trakt_key is not None:
-            trakt_metas = self.__get_trakt_recommendations(id, trakt_key)
-            catalog_ids.extend(trakt_metas)
-
-        catalog_ids = self.__filter_meta(catalog_ids, genre, skip)
-        catalogs_ids_not_cached = []
-        metas = []
-        for item in catalog_ids:
-            if isinstance(item, ImdbInfo):
-                meta = db_manager.cached_metas.get(item.id)
-                if meta is None:
-                    catalogs_ids_not_cached.append(item)
-                    continue
-                metas.append(meta)
+        if trakt_key is not None and id in TRAKT_CATALOG_TYPES:
+            trakt_infos = await self.__trakt_cache.get(
+                f"{id}:{trakt_key}",
+                lambda: asyncio.to_thread(self.__get_trakt_recommendations, id, trakt_key),
+            )
+            # Other requests keep the shared catalog, so its prebuilt index is used instead of a copy
+            if trakt_infos:
+                catalog_ids = [*catalog_ids, *trakt_infos]
+
+        catalog_ids = self.__filter_meta(id, catalog_ids, genre, skip)
+        sorted_metas = await self.__get_page_metas(catalog_ids)
+
+        return await self.__get_page_view(CachedPage(sorted_metas), rpdb_key, lang_key or "en")
+
+    async def __get_page_metas(self, catalog_ids: list[ImdbInfo]) -> list[dict]:
+        page_ids = [item.id for item in catalog_ids if isinstance(item, ImdbInfo)]
+        cached_metas = db_manager.cached_metas
+        metas_by_id = {}
+        keys_not_cached = []
+        for item_id in page_ids:
+            meta = cached_metas.get(item_id)
+            if meta is None:
+                keys_not_cached.append(item_id)
+                continue
+            metas_by_id[item_id] = meta
+
+        if len(keys_not_cached) > 0:
+            new_metas = await self.__meta_loader.load_many(keys_not_cached)
+            for meta in utils.index_by_id(list(new_metas.values())).values():
+                metas_by_id.setdefault(meta["id"], meta)
 
-        if len(catalogs_ids_not_cached) > 0:
-            keys = [item.id for item in catalogs_ids_not_cached]
-            new_metas = db_manager.get_metas_by_keys(keys)
-            metas.extend(new_metas.values())
+        return [metas_by_id[item_id] for item_id in page_ids if item_id in metas_by_id]
 
-        new_cached_metas = {}
-        for meta in metas:
-            meta_id = meta.get("id") or None
-            if meta_id is None:
+    def __is_known_filter(self, catalog_id: str, genre: str | None) -> bool:
+        if genre is None or genre in self.__genre_options.get(catalog_id, ()):
+            return True
+        if not self.__is_number(genre):
+            return False
+        index = db_manager.get_catalog_index(catalog_id)
+        return index is not None and index.has_year(int(genre))
+
+    def __get_genre_options(self) -> dict[str, list[str]]:
+        genre_options = {}
+        for catalog in db_manager.cached_manifest.get("catalogs", []):
+            catalog_id = catalog.get("id", None)
+            if catalog_id is None:
                 continue
-            for item in catalog_ids:
-                if isinstance(item, ImdbInfo) and item.id == meta_id:
-                    new_cached_metas.update({item.id: meta})
-                    break
-        db_manager.cached_metas.update(new_cached_metas)
-
-        sorted_metas = []
-        for item in catalog_ids:
-            if not isinstance(item, ImdbInfo):
+            for extra in catalog.get("extra") or []:
+                if extra.get("name") == "genre":
+                    genre_options.update({catalog_id: extra.get("options") or []})
+        return genre_options
+
+    def __count_catalog_request(self, catalog_id: str, genre: str | None):
+        self.__popularity.count(catalog_id, genre)
+
+    def __sync_popularity(self):
+        while True:
+            time.sleep(POPULARITY_SYNC_INTERVAL)
+            self.__popularity.sync()
+
+    def __get_popular_catalogs(self, count: int) -> list[tuple[str, str | None]]:
+        catalogs = db_manager.cached_catalogs
+        popular = [key for key in self.__popularity.most_common() if key[0] in catalogs][:count]
+        # Until there is traffic, fall back to the catalogs in manifest order
+        for catalog_id in catalogs:
+            if len(popular) >= count:
+                break
+            if (catalog_id, None) not in popular:
+                popular.append((catalog_id, None))
+        return popular
+
+    def __collect_metrics(self):
+        meta_stats = db_manager.meta_stats
+        metrics.META_CACHE_LOOKUPS.set(meta_stats.get("overlay_hits", 0), "overlay_hit")
+        metrics.META_CACHE_LOOKUPS.set(meta_stats["snapshot_hits"], "snapshot_hit")
+        metrics.META_CACHE_LOOKUPS.set(meta_stats["misses"], "miss")
+        if "overlay_bytes" in meta_stats:
+            metrics.META_STORE_ENTRIES.set(meta_stats["overlay_entries"])
+            metrics.META_STORE_BYTES.set(meta_stats["overlay_bytes"], "used")
+            metrics.META_STORE_BYTES.set(meta_stats["overlay_max_bytes"], "max")
+            metrics.META_STORE_EVICTIONS.set(meta_stats["overlay_evictions"])
+
+        loader_stats = self.__meta_loader.stats
+        metrics.META_LOADER_BATCHES.set(loader_stats["batches"])
+        metrics.META_LOADER_KEYS.set(loader_stats["requested_keys"], "requested")
+        metrics.META_LOADER_KEYS.set(loader_stats["fetched_keys"], "fetched")
+
+        page_cache = self.__page_cache
+        metrics.PAGE_CACHE_ENTRIES.set(len(page_cache))
+        metrics.PAGE_CACHE_BYTES.set(page_cache.nbytes, "used")
+        metrics.PAGE_CACHE_BYTES.set(page_cache.max_bytes, "max")
+        metrics.META_ENDPOINT_CACHE_BYTES.set(self.__meta_cache.nbytes, "used")
+        metrics.META_ENDPOINT_CACHE_BYTES.set(env.META_CACHE_MAX_MB * 1024 * 1024, "max")
+        metrics.HTTP_POOL_CONNECTIONS.clear()
+        metrics.HTTP_POOL_HTTP2_CONNECTIONS.clear()
+        for host, pool_stats in HttpSession.get_stats().items():
+            metrics.HTTP_POOL_CONNECTIONS.set(pool_stats["active"], host, "active")
+            metrics.HTTP_POOL_CONNECTIONS.set(pool_stats["idle"], host, "idle")
+            metrics.HTTP_POOL_HTTP2_CONNECTIONS.set(pool_stats["http2"], host)
+        for host, limiter_stats in RateLimiter.get_stats().items():
+            metrics.UPSTREAM_RATE_LIMIT.set(limiter_stats["rate"], host)
+            metrics.UPSTREAM_THROTTLED.set(limiter_stats["throttled"], host)
+            metrics.UPSTREAM_RATE_LIMIT_WAIT.set(limiter_stats["waited"], host)
+        metrics.LEADER.set(int(self.is_leader))
+        metrics.SNAPSHOT_VERSION.set(db_manager.snapshot_version)
+        created_at = db_manager.snapshot_created_at
+        if created_at is not None:
+            metrics.SNAPSHOT_AGE.set(round((datetime.now() - created_at).total_seconds(), 3))
+
+    def __load_manifest_info(self):
+        self.__manifest_name = db_manager.cached_manifest.get("name", "Unknown")
+        self.__manifest_version = db_manager.cached_manifest.get("version", "Unknown")
+        log.info(f"::=>[Manifest Name] {self.__manifest_name}")
+        log.info(f"::=>[Manifest Version] {self.__manifest_version}")
+
+    def __load_genre_options(self):
+        genre_options = self.__get_genre_options()
+        self.__genre_options = {catalog_id: set(options) for catalog_id, options in genre_options.items()}
+
+    def __on_snapshot_swap(self):
+        self.__load_manifest_info()
+        # Configured manifests built between the swap and this call carry the previous version
+        self.__manifest_index = ManifestIndex(db_manager.cached_manifest, version=self.__manifest_index.version + 1)
+        self.__load_genre_options()
+        self.__start_warm()
+
+    def __start_warm(self):
+        self.__warm_generation += 1
+        generation = self.__warm_generation
+        threading.Thread(name="Page Cache Warm", target=self.__warm, args=(generation,), daemon=True).start()
+
+    def __warm(self, generation: int):
+        with self.__prewarm_lock:
+            # A later swap started its own warm, this one would only render pages that are about to be replaced
+            if generation != self.__warm_generation:
+                return
+            try:
+                self.__rebuild_page_cache()
+                self.__prewarm()
+            except Exception as e:
+                log.error(f"::=>[Prewarm] Failed: {e}")
+
+    def __prewarm(self):
+        """Load the metas of the first pages of the most requested catalogs and render those pages."""
+        # Picks up the requests counted by the other workers since the last sync
+        self.__popularity.sync()
+        popular = self.__get_popular_catalogs(PREWARM_CATALOGS)
+        limit = PREWARM_PAGES * PAGE_SIZE
+        cached_metas = db_manager.cached_metas
+        filtered = {}
+        missing_keys = {}
+        for catalog_id, genre in popular:
+            catalog_ids = db_manager.cached_catalogs.get(catalog_id, {}).get("data") or []
+            items = self.__filter_items(catalog_id, catalog_ids, genre, limit=limit)
+            filtered[(catalog_id, genre)] = items
+            for item in items:
+                if item.id not in cached_metas:
+                    missing_keys[item.id] = None
+
+        keys = list(missing_keys)
+        chunk_size = 200
+        for i in range(0, len(keys), chunk_size):
+            db_manager.get_metas_by_keys(keys[i:i + chunk_size])
+
+        page_cache = self.__page_cache
+        rendered = 0
+        for (catalog_id, genre), items in filtered.items():
+            for skip in range(0, len(items), PAGE_SIZE):
+                if page_cache.get(catalog_id, genre, skip) is not None:
+                    continue
+                page_ids = items[skip:skip + PAGE_SIZE]
+                metas = [cached_metas.get(item.id) for item in page_ids]
+                # Metas can be evicted from the bounded overlay at any time
+                if any(meta is None for meta in metas):
+                    continue
+                page_cache.put(catalog_id, genre, skip, metas)
+                rendered += 1
+        log.info(f"::=>[Prewarm] {len(popular)} catalogs, {len(keys)} metas loaded, {rendered} pages rendered")
+
+    def __rebuild_page_cache(self):
+        """Render the first pages of every catalog and genre whose metas are in memory, then swap the cache in."""
+        previous = self.__page_cache
+        page_cache = CatalogPageCache(version=previous.version + 1)
+        cached_metas = db_manager.cached_metas
+        for catalog_id, genre, skip, page_ids in self.__iter_warm_pages():
+            if page_cache.nbytes >= page_cache.max_bytes:
+                # Any further page would only evict one rendered before it
+                break
+            metas = [cached_metas.get(item.id) for item in page_ids]
+            if any(meta is None for meta in metas):
                 continue
-            for meta in metas:
-                if meta.get("id") == item.id:
-                    sorted_metas.append(meta)
-                    break
-
-        if rpdb_key is not None:
-            sorted_metas = self.__rpdb_api.replace_posters(
-                metas=sorted_metas, api_key=rpdb_key, lang=lang_key or "en"
+            page_cache.put(catalog_id, genre, skip, metas)
+            # The previous cache is served until the swap below, together both stay within one budget
+            previous.trim(page_cache.max_bytes - page_cache.nbytes)
+        self.__page_cache = page_cache
+        log.info(f"::=>[Page Cache] version {page_cache.version} - {len(page_cache)} pages")
+
+    def __iter_warm_pages(self):
+        genre_options = self.__get_genre_options()
+        for catalog_id, catalog in db_manager.cached_catalogs.items():
+            catalog_ids = catalog.get("data") or []
+            for genre in [None, *genre_options.get(catalog_id, [])]:
+                items = self.__filter_items(catalog_id, catalog_ids, genre, limit=WARM_PAGES * PAGE_SIZE)
+                for skip in range(0, len(items), PAGE_SIZE):
+                    yield catalog_id, genre, skip, items[skip:skip + PAGE_SIZE]
+
+    def __filter_items(
+        self, catalog_id: str, items: list[ImdbInfo], genre: str | None, skip: int = 0, limit: int | None = None
+    ) -> list[ImdbInfo]:
+        index = db_manager.get_catalog_index(catalog_id)
+        if index is None or not index.is_valid_for(items):
+            index = CatalogIndex(items)
+        if genre is None:
+            return index.get_items(skip=skip, limit=limit)
+        if self.__is_number(genre):
+            return index.get_items(year=genre, skip=skip, limit=limit)
+        year_range = genre.split("-")
+        if len(year_range) == 2 and self.__is_number(year_range[0]) and self.__is_number(year_range[1]):
+            # Decades and other ranges such as "1990-1999"
+            return index.get_items(
+                year_from=int(year_range[0]), year_to=int(year_range[1]), skip=skip, limit=limit
             )
+        genre = self.__cinemeta.get_simplified_genre(genre) or genre
+        return index.get_items(genre=genre, skip=skip, limit=limit)
 
-        return {
-            "metas": sorted_metas,
-            "total": len(sorted_metas)
-        }
+    @staticmethod
+    def __is_number(value: str) -> bool:
+        # str.isdigit also accepts Unicode digits such as "²" that int() rejects
+        return value.isascii() and value.isdigit()
 
-    def __filter_meta(self, items: list[ImdbInfo], genre: str | None, skip: int) -> list:
-        new_items = []
-        if genre is not None:
-            if genre.isnumeric():
-                for item in items:
-                    if genre != item.year:
-                        continue
-                    new_items.append(item)
-            else:
-                genre = self.__provider.cinemeta.get_simplified_genre(genre) or genre
-                for item in items:
-                    if genre not in item.genres:
-                        continue
-                    new_items.append(item)
-        else:
-            new_items = items
-
-        page_size = 25
-        min_step = min(skip + page_size, len(new_items))
-        return new_items[skip:min_step]
+    def __filter_meta(self, catalog_id: str, items: list[ImdbInfo], genre: str | None, skip: int) -> list:
+        return self.__filter_items(catalog_id, items, genre, skip=skip, limit=PAGE_SIZE)
 
     @property
     def manifest(self):
@@ -273,14 +559,16 @@ class WebWorker:
 
     @property
     def last_update(self) -> datetime:
-        return self.__last_update
+        """When the served snapshot was written, the same on every worker, or the boot time without one."""
+        created_at = db_manager.snapshot_created_at
+        return created_at if created_at is not None else self.__last_update
 
     @last_update.setter
     def last_update(self, value: datetime):
         self.__last_update = value
 
-    def get_recent_changes(self) -> dict:
-        recent_changes = db_manager.get_recent_changes()
+    async def get_recent_changes(self) -> dict:
+        recent_changes = await db_manager.get_recent_changes_async()
         report = {
             "summary": {
                 "total_changes": len(recent_changes),
@@ -308,27 +596,17 @@ class WebWorker:
     def force_update(self):
         try:
             log.info("::=>[Update] Starting forced update...")
-            
-            # Perform update in chunks o minimize data loss risk
-            catalogs = db_manager.get_catalogs()
-            if not catalogs:
-                raise ValueError("No catalogs retrieved")
-            self.__builder.build()
-            # Update database in smaller transactions
-            chunk_size = 100
-            for i in range(0, len(catalogs), chunk_size):
-                chunk = dict(list(catalogs.items())[i:i + chunk_size])
-                try:
-                    
-                    db_manager.update_catalogs(chunk)
-                    log.info(f"::=>[Update] Processed chunk {i//chunk_size + 1}")
-                except Exception as chunk_error:
-                    log.error(f"::=>[Update] Chunk update failed: {str(chunk_error)}")
-                    raise
-            
-            self.__last_update = datetime.now()
-            log.info("::=>[Update] Forced update completed successfully")
-            
+            previous_version = db_manager.snapshot_version
+
+            # The builder publishes a new snapshot in one swap, a failed build leaves the current one served
+            if not self.__get_builder().build():
+                raise ValueError("No catalogs built")
+
+            log.info(
+                f"::=>[Update] Forced update completed successfully "
+                f"(snapshot {previous_version} -> {db_manager.snapshot_version})"
+            )
+
         except Exception as e:
             log.error(f"::=>[Update Failed] Unexpected error: {str(e)}")
             raise
@@ -338,10 +616,18 @@ class WebWorker:
         max_retries = 3
         retry_delay = 60
         failure_reschedule = 300
+        reconciled = False
 
         while True:
             try:
+                if not reconciled and db_manager.booted_from_snapshot and self.__leader_lock.try_acquire():
+                    reconciled = True
+                    db_manager.reconcile_snapshot()
                 time.sleep(self.__update_interval)
+                # Only the leader builds, followers pick up its snapshot and retry the lock in case it exits
+                if not self.__leader_lock.try_acquire():
+                    self.__update_interval = self.get_update_interval()
+                    continue
                 if not self.__perform_update_with_retries(max_retries, retry_delay):
                     log.error("::=>[Update Failed] Scheduling earlier retry in 5 minutes")
                     time.sleep(failure_reschedule)
@@ -354,34 +640,20 @@ class WebWorker:
     def __perform_update_with_retries(self, max_retries, retry_delay):
         for attempt in range(max_retries):
             try:
-                # Store the current state before update
-                previous_state = {
-                    "catalogs": db_manager.cached_catalogs.copy(),
-                    "metas": db_manager.cached_metas.copy()
-                }
-                
-                # Attempt the update
                 self.force_update()
                 return True
-                
+
             except Exception as e:
                 log.error(f"::=>[Update Failed] Error: {str(e)}")
-                
-                try:
-                    # Restore previous state in cache
-                    db_manager.cached_catalogs = previous_state["catalogs"]
-                    db_manager.cached_metas = previous_state["metas"]
-                    log.info("::=>[Recovery] Restored previous cache state")
-                except Exception as restore_error:
-                    log.error(f"::=>[Recovery Failed] Could not restore cache: {str(restore_error)}")
-                
+                log.info(f"::=>[Recovery] Still serving snapshot {db_manager.snapshot_version}")
+
                 if attempt < max_retries - 1:
                     wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
                     log.info(f"::=>[Retry] Waiting {wait_time} seconds before attempt {attempt + 2}/{max_retries}")
                     time.sleep(wait_time)
                 else:
                     log.error("::=>[Update Failed] All retry attempts exhausted")
-                    
+
         return False
 
     def __extras_parser(self, extras: str | None) -> dict:
@@ -397,7 +669,7 @@ class WebWorker:
                     result.update({"genre": splited_genre[1].replace("$", " & ")})
                 elif "skip" in value:
                     splited_skip = value.split("=")
-                    if len(splited_skip) == 1:
+                    if len(splited_skip) == 1 or not self.__is_number(splited_skip[1]):
                         continue
                     result.update({"skip": int(splited_skip[1])})
 
@@ -432,7 +704,7 @@ class WebWorker:
         return True
 
     def is_updater_healthy(self):
-        return self.__background_threading_0.is_alive()
+        return env.SERVE_ONLY or self.__background_threading_0.is_alive()
 
     def restart_updater_if_needed(self):
         if not self.is_updater_healthy():
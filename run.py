@@ -2,11 +2,12 @@ import os
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.gzip import GZipMiddleware
-from lib import env
+from lib import env, metrics
+from lib.utils import compute_etag
 from lib.web_worker import WebWorker
 
 SERVER_VERSION = "2.0.0"
@@ -14,6 +15,7 @@ SERVER_VERSION = "2.0.0"
 worker = WebWorker()
 app = FastAPI()
 app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(metrics.MetricsMiddleware)
 
 project_dir = os.path.join(app.root_path, "web/")
 app.mount("/static", StaticFiles(directory=project_dir), name="static")
@@ -44,23 +46,67 @@ def add_cache_headers(max_age: int) -> dict:
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Check server health."""
-    catalogs = worker.get_web_config().get("config", {}).get("catalogs", [])
+    config, _ = worker.get_web_config()
+    catalogs = config.get("config", {}).get("catalogs", [])
     if catalogs == []:
         return JSONResponse({"status": "error"}, status_code=500)
     return JSONResponse({"status": "ok"}, status_code=200)
 
 
-def __json_response(data: dict, extra_headers: dict[str, str] = {}, status_code: int = 200):
+@app.get("/metrics", tags=["Health"])
+async def metrics_endpoint():
+    """Server metrics in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def __json_response(
+    data: dict, extra_headers: dict[str, str] = {}, status_code: int = 200, request: Request | None = None
+):
     response = JSONResponse(data, status_code=status_code)
     headers = {
         "Access-Control-Allow-Origin": "*",
         "Access-Control-Allow-Headers": "*",
     }
     headers.update(extra_headers)
+    if request is not None:
+        etag = compute_etag(response.body)
+        if __is_not_modified(request, etag):
+            return __not_modified_response(etag, extra_headers)
+        headers.update({"ETag": etag})
     response.headers.update(headers)
     return response
 
 
+def __bytes_response(body: bytes, encoding: str | None, extra_headers: dict[str, str] = {}):
+    headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "*",
+        "Vary": "Accept-Encoding",
+    }
+    headers.update(extra_headers)
+    if encoding is not None:
+        headers.update({"Content-Encoding": encoding})
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def __is_not_modified(request: Request, etag: str | None) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if etag is None or if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def __not_modified_response(etag: str, extra_headers: dict[str, str] = {}):
+    headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Headers": "*",
+        "ETag": etag,
+    }
+    headers.update(extra_headers)
+    return Response(status_code=304, headers=headers)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     cache_age = 60 * 60 * 2  # 2 hours
@@ -82,7 +128,7 @@ async def last_update():
 
 @app.get("/recent_changes.json")
 async def recent_changes():
-    changes = worker.get_recent_changes()
+    changes = await worker.get_recent_changes()
     return __json_response(changes)
 
 
@@ -120,46 +166,63 @@ async def manifest(
     configs: str | None = None,
 ):
     referer = str(request.base_url)
-    manifest = worker.get_configured_manifest(referer, configs)
-    manifest.update({"server_version": SERVER_VERSION})
+    manifest, manifest_etag = worker.get_configured_manifest(referer, configs)
     headers = add_cache_headers(CACHE_DURATIONS["SHORT"])
-    return __json_response(manifest, extra_headers=headers)
+    etag = compute_etag(f"{manifest_etag}{SERVER_VERSION}".encode())
+    if __is_not_modified(request, etag):
+        return __not_modified_response(etag, extra_headers=headers)
+    headers.update({"ETag": etag})
+    return __json_response({**manifest, "server_version": SERVER_VERSION}, extra_headers=headers)
 
 
 @app.get("/web_config.json")
-async def web_config():
-    config = worker.get_web_config()
+async def web_config(request: Request):
+    config, etag = worker.get_web_config()
     headers = add_cache_headers(CACHE_DURATIONS["MEDIUM"])
+    if __is_not_modified(request, etag):
+        return __not_modified_response(etag, extra_headers=headers)
+    headers.update({"ETag": etag})
     return __json_response(config, extra_headers=headers)
 
 
 @app.get("/meta/{type}/{id}.json")
 @app.get("/c/{configs}/meta/{type}/{id}.json")
-async def meta(type: str | None, id: str | None, configs: str | None = None):
+async def meta(request: Request, type: str | None, id: str | None, configs: str | None = None):
     if id is None or type is None:
         return HTTPException(status_code=404, detail="Not found")
-    meta = worker.get_meta(id=id, s_type=type, config=configs)
+    meta, etag = await worker.get_meta(id=id, s_type=type, config=configs)
     headers = add_cache_headers(CACHE_DURATIONS["VERY_LONG"])
+    if __is_not_modified(request, etag):
+        return __not_modified_response(etag, extra_headers=headers)
+    if etag is not None:
+        headers.update({"ETag": etag})
     return __json_response(meta, extra_headers=headers)
 
 
 @app.get("/catalog/{type}/{id}.json")
 @app.get("/catalog/{type}/{id}/{extras}.json")
-async def catalog(type: str | None, id: str | None, extras: str | None = None):
-    return await catalog_with_configs(configs=None, type=type, id=id, extras=extras)
+async def catalog(request: Request, type: str | None, id: str | None, extras: str | None = None):
+    return await catalog_with_configs(request=request, configs=None, type=type, id=id, extras=extras)
 
 
 @app.get("/c/{configs}/catalog/{type}/{id}.json")
 @app.get("/c/{configs}/catalog/{type}/{id}/{extras}.json")
 async def catalog_with_configs(
-    configs: str | None, type: str | None, id: str | None, extras: str | None = None
+    request: Request, configs: str | None, type: str | None, id: str | None, extras: str | None = None
 ):
     if id is None:
         return HTTPException(status_code=404, detail="Not found")
 
-    metas = await worker.get_configured_catalog(id=id, extras=extras, config=configs)
     headers = add_cache_headers(CACHE_DURATIONS["MEDIUM"])
-    return __json_response(metas, extra_headers=headers)
+    page = await worker.get_catalog_page(id=id, extras=extras, config=configs)
+    if page is None:
+        page = await worker.get_configured_catalog(id=id, extras=extras, config=configs)
+    # Checked before rendering, a revalidated page does not use the RPDB quota of its user
+    if __is_not_modified(request, page.etag):
+        return __not_modified_response(page.etag, extra_headers=headers)
+    headers.update({"ETag": page.etag})
+    body, encoding = page.encode(request.headers.get("Accept-Encoding", ""))
+    return __bytes_response(body, encoding, extra_headers=headers)
 
 if __name__ == "__main__":
     uvicorn.run(
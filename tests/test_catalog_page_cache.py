@@ -0,0 +1,43 @@
+import orjson
+import pytest
+
+from lib.apis.rpdb import RPDB
+from lib.catalog_page_cache import CachedPage, PageView
+
+METAS = [
+    {"id": "tt0000001", "name": "With poster", "poster": "https://img/tt0000001.jpg", "genres": ["Drama"]},
+    {"id": "tt0000002", "name": "Without poster"},
+    {"id": "tt0000003", "poster": None, "name": "Null poster"},
+    {"id": "tt0000004", "poster": "https://img/same.jpg", "videos": [{"poster": "https://img/same.jpg"}]},
+    {"name": "No id", "poster": "https://img/none.jpg"},
+    {},
+]
+
+
+@pytest.mark.parametrize("api_key", ["t0-key", "t1-key"])
+@pytest.mark.parametrize("metas", [METAS, METAS[:1], METAS[1:2], []])
+def test_cached_posters_match_replace_posters(metas, api_key):
+    rpdb = RPDB()
+    page = CachedPage(metas)
+    view = PageView(
+        page,
+        poster_for=lambda imdb_id: rpdb.get_poster(imdb_id=imdb_id, api_key=api_key, lang="fr"),
+        variant=f"{api_key}:fr",
+    )
+
+    body, encoding = view.encode("gzip, br")
+
+    expected = rpdb.replace_posters(metas=metas, api_key=api_key, lang="fr")
+    assert encoding is None
+    assert body == orjson.dumps({"metas": expected, "total": len(expected)})
+    assert orjson.loads(page.body) == {"metas": metas, "total": len(metas)}
+
+
+def test_quota_is_used_only_when_posters_are_rendered():
+    rendered = []
+    view = PageView(CachedPage(METAS), poster_for=lambda imdb_id: "p", on_render=lambda: rendered.append(True))
+
+    assert view.etag != CachedPage(METAS).etag
+    assert rendered == []
+    view.encode("")
+    assert rendered == [True]